@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class ArtifactCache:
+    '''
+    Artifact Cache class keeps a local copy of the files downloaded from S3 and urls, so
+    unchanged files are not downloaded again on the next run.
+
+    Every download is checked with a conditional request (If-None-Match/If-Modified-Since for
+    urls, head_object for S3) and the cached copy is used when the source has not changed.
+    Files are stored under the sha256 of their content, and the least recently used ones are
+    removed once the cache grows past max_bytes. The cache directory is only created when the
+    first file is stored, and files are written under unique temporary names before being
+    moved into place, so runs sharing the cache never write over each other's half-written files.
+
+    Attributes:
+    ----------
+    cache_dir: str
+        the directory holding the cached files and their index
+
+    max_bytes: int
+        the max total size of the cached files
+
+    bypass: bool
+        if True, the cache is ignored and every file is downloaded again
+
+    Methods:
+    -------
+    fetch_url(url, headers, timeout)
+        returns the local path of the file at the url
+
+    fetch_s3(s3_client, bucket, key)
+        returns the local path of the object in the s3 bucket
+
+    store(source, content, etag, last_modified)
+        saves the downloaded content under the source name
+
+    evict(keep)
+        removes the least recently used files until the cache fits in max_bytes
+
+    remove_unreferenced(digest, index)
+        deletes the file with the digest if no source points to it any more
+    '''
+    def __init__(self, cache_dir='.cache/artifacts', max_bytes=1024 ** 3, bypass=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.__lock = threading.Lock()
+
+    def read_index(self):
+        '''
+        reads the cache index, which maps each source to its file, etag and last use
+
+        Returns:
+        --------
+        index: dict
+            the cache entries keyed by source
+        '''
+        index_path = os.path.join(self.cache_dir, 'index.json')
+        if not os.path.exists(index_path):
+            return {}
+        with open(index_path, 'r') as file:
+            return json.load(file)
+
+    def write_index(self, index):
+        '''
+        replaces the cache index on disk
+
+        Parameters:
+        -----------
+        index: dict
+            the cache entries keyed by source
+        '''
+        self.write_file(os.path.join(self.cache_dir, 'index.json'), json.dumps(index, indent=4).encode())
+
+    def write_file(self, path, content):
+        '''
+        writes a file through a uniquely named temporary file in the same directory, which is
+        then moved into place, creating the directory if needed
+
+        Parameters:
+        -----------
+        path: str
+            the location of the file
+
+        content: bytes
+            the content of the file
+        '''
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix='.tmp-', delete=False) as file:
+            file.write(content)
+        try:
+            os.replace(file.name, path)
+        except OSError:
+            os.remove(file.name)
+            raise
+
+    def object_path(self, digest):
+        '''
+        returns the path of the cached file with the given sha256 digest
+        '''
+        return os.path.join(self.cache_dir, 'objects', digest)
+
+    def lookup(self, source):
+        '''
+        returns the cache entry of the source if its file is still on disk
+
+        Parameters:
+        -----------
+        source: str
+            the url or s3://bucket/key of the file
+
+        Returns:
+        --------
+        entry: dict or None
+            the cache entry
+        '''
+        if self.bypass:
+            return None
+        with self.__lock:
+            entry = self.read_index().get(source)
+        if entry is None or not os.path.exists(self.object_path(entry['digest'])):
+            return None
+        return entry
+
+    def touch(self, source):
+        '''
+        marks the source as used now and returns the path of its file
+
+        Parameters:
+        -----------
+        source: str
+            the url or s3://bucket/key of the file
+
+        Returns:
+        --------
+        path: str
+            the local path of the cached file
+        '''
+        with self.__lock:
+            index = self.read_index()
+            index[source]['last_used'] = time.time()
+            self.write_index(index)
+            return self.object_path(index[source]['digest'])
+
+    def store(self, source, content, etag=None, last_modified=None):
+        '''
+        saves the downloaded content of the source and evicts old files if needed. The file of
+        the source's previous content is deleted unless another source points to it, and the
+        new file is never evicted straight away, even if it's larger than max_bytes on its own.
+
+        Parameters:
+        -----------
+        source: str
+            the url or s3://bucket/key of the file
+
+        content: bytes
+            the downloaded file
+
+        etag: str
+            the ETag returned by the source
+
+        last_modified: str
+            the Last-Modified header returned by the source
+
+        Returns:
+        --------
+        path: str
+            the local path of the cached file
+        '''
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            self.write_file(path, content)
+        with self.__lock:
+            index = self.read_index()
+            previous_entry = index.get(source)
+            index[source] = {
+                'digest': digest,
+                'size': len(content),
+                'etag': etag,
+                'last_modified': last_modified,
+                'last_used': time.time(),
+            }
+            if previous_entry is not None and previous_entry['digest'] != digest:
+                self.remove_unreferenced(previous_entry['digest'], index)
+            self.write_index(index)
+        self.evict(keep=source)
+        return path
+
+    def evict(self, keep=None):
+        '''
+        removes the least recently used files until the total size is at most max_bytes.
+        A file is only deleted once no source points to it any more.
+
+        Parameters:
+        -----------
+        keep: str
+            a source that is never evicted (the one just stored, whose path is being returned)
+        '''
+        with self.__lock:
+            index = self.read_index()
+            sizes = {entry['digest']: entry['size'] for entry in index.values()}
+            total_bytes = sum(sizes.values())
+            for source, entry in sorted(index.items(), key=lambda item: item[1]['last_used']):
+                if total_bytes <= self.max_bytes:
+                    break
+                if source == keep:
+                    continue
+                del index[source]
+                if self.remove_unreferenced(entry['digest'], index):
+                    total_bytes -= sizes[entry['digest']]
+            self.write_index(index)
+
+    def remove_unreferenced(self, digest, index):
+        '''
+        deletes the cached file with the digest if no source in the index points to it
+
+        Parameters:
+        -----------
+        digest: str
+            the sha256 digest of the file
+
+        index: dict
+            the cache entries keyed by source
+
+        Returns:
+        --------
+        removed: bool
+            True if no source points to the file any more
+        '''
+        if any(entry['digest'] == digest for entry in index.values()):
+            return False
+        if os.path.exists(self.object_path(digest)):
+            os.remove(self.object_path(digest))
+        return True
+
+    def fetch_url(self, url, headers=None, timeout=60):
+        '''
+        returns the local path of the file at the url. The cached copy is used if the server
+        answers 304 Not Modified to a conditional request.
+
+        Parameters:
+        -----------
+        url: str
+            the url of the file
+
+        headers: dict
+            extra headers sent with the request (e.g. the api key)
+
+        timeout: float
+            the number of seconds to wait for the server to respond
+
+        Returns:
+        --------
+        path: str
+            the local path of the file
+        '''
+        import requests
+        headers = dict(headers or {})
+        entry = self.lookup(url)
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = requests.get(url, headers=headers, timeout=timeout)
+        if entry is not None and response.status_code == 304:
+            return self.touch(url)
+        response.raise_for_status()
+        return self.store(url, response.content,
+                          response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+    def fetch_s3(self, s3_client, bucket, key):
+        '''
+        returns the local path of the object in the s3 bucket. The cached copy is used if
+        head_object returns the same ETag as the cached one.
+
+        Parameters:
+        -----------
+        s3_client: boto3 S3 client
+            the client used to reach the bucket
+
+        bucket: str
+            the name of the bucket
+
+        key: str
+            the name of the object in the bucket
+
+        Returns:
+        --------
+        path: str
+            the local path of the file
+        '''
+        source = f"s3://{bucket}/{key}"
+        entry = self.lookup(source)
+        if entry is not None and entry['etag']:
+            if s3_client.head_object(Bucket=bucket, Key=key)['ETag'] == entry['etag']:
+                return self.touch(source)
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+        return self.store(source, response['Body'].read(), response['ETag'],
+                          str(response.get('LastModified')))
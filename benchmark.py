@@ -0,0 +1,471 @@
+import argparse
+import json
+import os
+import re
+import string
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from data_cleaning import DataCleaning
+
+
+class SyntheticData:
+    '''
+    Synthetic Data class generates seeded dataframes shaped like the raw tables, including the
+    dirty values the cleaners have to deal with: 'NULL'/'N/A' strings, 'GGB' country codes,
+    '@@' emails, +44(0)/+49(0)/+1 phone numbers, '12 x 100g' weights, dates in several formats,
+    garbage store types and whole garbage rows of random 10 character codes.
+
+    Attributes:
+    ----------
+    seed: int
+        the seed of the random generator, so the same data is generated on every run
+
+    garbage_rate: float
+        the share of rows filled with random 10 character codes
+
+    Methods:
+    -------
+    users(n)
+        generates the legacy_users table
+
+    cards(n)
+        generates the card details table
+
+    stores(n)
+        generates the store details table
+
+    products(n)
+        generates the products table
+
+    orders(n)
+        generates the orders table
+
+    date_events(n)
+        generates the date events table
+    '''
+    def __init__(self, seed=0, garbage_rate=0.01):
+        self.seed = seed
+        self.garbage_rate = garbage_rate
+
+    def rng(self, table_name):
+        '''
+        returns a random generator seeded from the seed and the table name
+        '''
+        return np.random.default_rng([self.seed, sum(map(ord, table_name))])
+
+    @staticmethod
+    def codes(rng, n, length=10):
+        '''
+        returns n random codes of upper case letters and digits, like the garbage rows
+        '''
+        alphabet = np.array(list(string.ascii_uppercase + string.digits), dtype='S1')
+        characters = rng.choice(alphabet, size=(n, length))
+        return pd.Series(characters.view(f'S{length}').ravel().astype(str), dtype=object)
+
+    @staticmethod
+    def uuids(rng, n):
+        '''
+        returns n random uuid strings
+        '''
+        high = rng.integers(0, 2 ** 63, n, dtype=np.uint64)
+        low = rng.integers(0, 2 ** 63, n, dtype=np.uint64)
+        return [f"{a:016x}{b:016x}" for a, b in zip(high, low)]
+
+    @staticmethod
+    def dates(rng, n, start='1940-01-01', end='2022-12-31'):
+        '''
+        returns n date strings mixing the formats found in the raw tables, with some 'NULL' values
+        '''
+        days = pd.to_datetime(start) + pd.to_timedelta(rng.integers(0, (pd.to_datetime(end) - pd.to_datetime(start)).days, n), unit='D')
+        formats = ['%Y-%m-%d', '%Y %B %d', '%B %Y %d', '%Y/%m/%d']
+        chosen = rng.choice(len(formats), n, p=[0.9, 0.04, 0.04, 0.02])
+        values = pd.Series(days.strftime('%Y-%m-%d'), dtype=object)
+        for code in range(1, len(formats)):
+            mask = chosen == code
+            values[mask] = days[mask].strftime(formats[code])
+        values[rng.random(n) < 0.005] = 'NULL'
+        return values
+
+    def add_garbage_rows(self, rng, df):
+        '''
+        overwrites a share of the rows with random 10 character codes in every column
+        '''
+        garbage = np.flatnonzero(rng.random(len(df)) < self.garbage_rate)
+        for column in df.columns:
+            df[column] = df[column].astype(object)
+            df.loc[df.index[garbage], column] = self.codes(rng, len(garbage)).to_numpy()
+        return df
+
+    def users(self, n):
+        '''
+        returns n rows shaped like the legacy_users table from AWS RDS
+        '''
+        rng = self.rng('users')
+        country_code = rng.choice(['GB', 'DE', 'US', 'GGB'], n, p=[0.6, 0.2, 0.19, 0.01])
+        country = pd.Series(country_code).map({'GB': 'United Kingdom', 'GGB': 'United Kingdom',
+                                               'DE': 'Germany', 'US': 'United States'})
+        phone_formats = np.array(['+44(0)1184960109', '(0161) 496 0674', '+49(0)047905356', '030 999321',
+                                  '+1-403-283-9012x1234', '001-403.283.9012'])
+        email_domains = rng.choice(['@example.com', '@@example.org', '@mail.de'], n, p=[0.6, 0.05, 0.35])
+        first_name = rng.choice(['Sigfried', 'Guy', 'Harry', 'Anna', 'NULL'], n, p=[0.25, 0.25, 0.25, 0.245, 0.005])
+        df = pd.DataFrame({
+            'index': np.arange(n),
+            'first_name': first_name,
+            'last_name': rng.choice(['Noack', 'Allen', 'Lawrence', 'Smith'], n),
+            'date_of_birth': self.dates(rng, n, '1940-01-01', '2006-12-31'),
+            'company': rng.choice(['Heydrich Junitz KG', 'Lewis LLC', 'Cooper-Dyer'], n),
+            'email_address': pd.Series(first_name).str.lower() + email_domains,
+            'address': rng.choice(['Zimmerstr. 1/0\n59015 Gießen', '44 Jones Street\nLondon', 'N/A'], n),
+            'country': country,
+            'country_code': country_code,
+            'phone_number': rng.choice(phone_formats, n),
+            'join_date': self.dates(rng, n, '1992-01-01', '2022-12-31'),
+            'user_uuid': self.uuids(rng, n),
+        })
+        return self.add_garbage_rows(rng, df)
+
+    def cards(self, n):
+        '''
+        returns n rows shaped like the card details table from the pdf
+        '''
+        rng = self.rng('cards')
+        card_number = pd.Series(rng.integers(10 ** 11, 10 ** 16, n).astype(str), dtype=object)
+        question_marks = rng.random(n) < 0.02
+        card_number[question_marks] = '???' + card_number[question_marks]
+        card_number[rng.random(n) < 0.005] = 'NULL'
+        df = pd.DataFrame({
+            'card_number': card_number,
+            'expiry_date': pd.Series(rng.integers(1, 13, n)).map('{:02d}'.format) + '/' + pd.Series(rng.integers(22, 32, n)).astype(str),
+            'card_provider': rng.choice(['VISA 16 digit', 'Diners Club / Carte Blanche', 'American Express', 'JCB 15 digit', 'NULL'], n),
+            'date_payment_confirmed': self.dates(rng, n, '1990-01-01', '2022-12-31'),
+        })
+        return self.add_garbage_rows(rng, df)
+
+    def stores(self, n):
+        '''
+        returns n rows shaped like the store details table from the API
+        '''
+        rng = self.rng('stores')
+        store_type = pd.Series(rng.choice(['Local', 'Super Store', 'Mall Kiosk', 'Outlet', 'Web Portal', 'NULL'], n,
+                                          p=[0.5, 0.2, 0.1, 0.1, 0.09, 0.01]), dtype=object)
+        garbage_type = rng.random(n) < 0.01
+        store_type[garbage_type] = self.codes(rng, int(garbage_type.sum())).to_numpy()
+        latitude = pd.Series(np.round(rng.uniform(-90, 90, n), 5).astype(str), dtype=object)
+        latitude[rng.random(n) < 0.01] = 'N/A'
+        longitude = pd.Series(np.round(rng.uniform(-180, 180, n), 5).astype(str), dtype=object)
+        longitude[rng.random(n) < 0.01] = 'N/A'
+        staff_numbers = pd.Series(rng.integers(1, 100, n).astype(str), dtype=object)
+        staff_numbers[rng.random(n) < 0.01] = 'J78'
+        df = pd.DataFrame({
+            'index': np.arange(n),
+            'address': rng.choice(['Flat 72W\nSally isle\nEast Deantown\nE7B 8EB', 'Heckerstraße 4/5\n50491 Säckingen', 'N/A'], n),
+            'longitude': longitude,
+            'lat': None,
+            'locality': rng.choice(['High Wycombe', 'Landshut', 'Lancaster', 'N/A'], n),
+            'store_code': pd.Series(rng.choice(['HI', 'LA', 'LAN'], n)) + '-' + pd.Series(self.uuids(rng, n)).str[:8].str.upper(),
+            'staff_numbers': staff_numbers,
+            'opening_date': self.dates(rng, n, '1990-01-01', '2022-12-31'),
+            'store_type': store_type,
+            'latitude': latitude,
+            'country_code': rng.choice(['GB', 'DE', 'US', 'NULL'], n, p=[0.6, 0.2, 0.19, 0.01]),
+            'continent': rng.choice(['Europe', 'America', 'eeEurope', 'eeAmerica'], n, p=[0.75, 0.2, 0.03, 0.02]),
+        })
+        return self.add_garbage_rows(rng, df)
+
+    def products(self, n):
+        '''
+        returns n rows shaped like the products table from the s3 bucket
+        '''
+        rng = self.rng('products')
+        weights = np.array(['12 x 100g', '77g', '5oz', '1.5kg', '77g .', '400ml', '3 x 2g', '2kg'])
+        df = pd.DataFrame({
+            'Unnamed: 0': np.arange(n),
+            'product_name': rng.choice(['FurReal Dazzlin\' Dimples My Playful Dolphin', 'Tiffany 17.5cm Cut Glass Vase', 'Tefal Jamie Oliver Saucepan'], n),
+            'product_price': '£' + pd.Series(np.round(rng.uniform(0.5, 800, n), 2)).astype(str),
+            'weight': rng.choice(weights, n),
+            'category': rng.choice(['toys-and-games', 'sports-and-leisure', 'pets', 'homeware', 'health-and-beauty', 'food-and-drink', 'diy'], n),
+            'EAN': rng.integers(10 ** 12, 10 ** 13, n).astype(str),
+            'date_added': self.dates(rng, n, '1995-01-01', '2022-12-31'),
+            'uuid': self.uuids(rng, n),
+            'removed': rng.choice(['Still_avaliable', 'Removed'], n, p=[0.9, 0.1]),
+            'product_code': pd.Series(rng.choice(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'), n)) + pd.Series(rng.integers(0, 10, n)).astype(str) + '-' + pd.Series(rng.integers(10 ** 6, 10 ** 7, n)).astype(str) + 'u',
+        })
+        return self.add_garbage_rows(rng, df)
+
+    def orders(self, n):
+        '''
+        returns n rows shaped like the orders table from AWS RDS
+        '''
+        rng = self.rng('orders')
+        return pd.DataFrame({
+            'level_0': np.arange(n),
+            'index': np.arange(n),
+            'date_uuid': self.uuids(rng, n),
+            'first_name': None,
+            'last_name': None,
+            'user_uuid': self.uuids(rng, n),
+            'card_number': rng.integers(10 ** 11, 10 ** 16, n),
+            'store_code': pd.Series(rng.choice(['HI', 'LA', 'WEB'], n)) + '-' + pd.Series(rng.integers(10 ** 7, 10 ** 8, n)).astype(str),
+            'product_code': pd.Series(rng.choice(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'), n)) + pd.Series(rng.integers(0, 10, n)).astype(str) + '-' + pd.Series(rng.integers(10 ** 6, 10 ** 7, n)).astype(str) + 'u',
+            '1': None,
+            'product_quantity': rng.integers(1, 14, n),
+        })
+
+    def date_events(self, n):
+        '''
+        returns n rows shaped like the date events table from the json file
+        '''
+        rng = self.rng('date_events')
+        seconds = rng.integers(0, 24 * 3600, n)
+        timestamp = pd.Series(pd.to_timedelta(seconds, unit='s')).astype(str).str[-8:].to_numpy()
+        df = pd.DataFrame({
+            'timestamp': timestamp,
+            'month': rng.integers(1, 13, n).astype(str),
+            'year': rng.integers(1992, 2023, n).astype(str),
+            'day': rng.integers(1, 32, n).astype(str),
+            'time_period': rng.choice(['Evening', 'Morning', 'Midday', 'Late_Hours'], n),
+            'date_uuid': self.uuids(rng, n),
+        }, index=np.arange(n).astype(str))
+        df.loc[rng.random(n) < 0.002, ['month', 'year', 'day']] = 'NULL'
+        return self.add_garbage_rows(rng, df)
+
+
+def cleaners():
+    '''
+    Returns the table generator and DataCleaning method benchmarked for each table.
+
+    Returns:
+    --------
+        cleaners: dict
+            (generator name, cleaning method name) keyed by benchmark name
+    '''
+    return {
+        'clean_user_data': ('users', 'clean_user_data'),
+        'clean_card_data': ('cards', 'clean_card_data'),
+        'clean_products_data': ('products', 'clean_products_data'),
+        'called_clean_store_data': ('stores', 'called_clean_store_data'),
+        'clean_orders_data': ('orders', 'clean_orders_data'),
+        'clean_event_date': ('date_events', 'clean_event_date'),
+    }
+
+
+def measure(generate, clean, rows):
+    '''
+    Times one cleaning method on a freshly generated table, then runs it again on another fresh
+    copy under tracemalloc to record its peak memory (so tracing does not slow the timed run).
+
+    Parameters:
+    -----------
+        generate: function
+            returns the raw table with the given number of rows
+
+        clean: function
+            the DataCleaning method
+
+        rows: int
+            the number of rows of the table
+
+    Returns:
+    --------
+        result: dict
+            the rows in and out, the seconds taken, the rows per second and the peak memory in MB
+    '''
+    df = generate(rows)
+    start_time = time.perf_counter()
+    cleaned = clean(df)
+    seconds = time.perf_counter() - start_time
+    rows_out = len(cleaned)
+    del df, cleaned
+
+    df = generate(rows)
+    tracemalloc.start()
+    clean(df)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'rows_in': rows,
+        'rows_out': rows_out,
+        'seconds': round(seconds, 4),
+        'rows_per_second': round(rows / seconds) if seconds else None,
+        'peak_memory_mb': round(peak / 1024 ** 2, 2),
+    }
+
+
+def convert_to_kg(weight_string):
+    '''
+    Converts one weight such as "12 x 100g", "77g" or "77g ." to kg the way DataCleaning did
+    before parse_weight, one value at a time. Kept as the baseline of compare_weight_parsing.
+
+    Parameters:
+    -----------
+        weight_string: string
+            the weight from the weight column
+
+    Returns:
+    --------
+        weight_kg: float
+            the weight in kilograms, NaN if it doesn't follow one of the known formats
+    '''
+    kg_per_unit = {'kg': 1, 'g': 0.001, 'ml': 0.001, 'oz': 0.0283495}
+    if not re.search(r'\d+[g|kg|ml|oz]', weight_string):
+        return np.nan
+    weight_string = weight_string.replace(' .', '').strip()
+    unit = weight_string[-2:] if weight_string[-2:] in kg_per_unit else weight_string[-1:]
+    quantity = weight_string[:-len(unit)]
+    if 'x' in quantity:
+        multiplier, quantity = quantity.split('x')
+        return float(multiplier) * float(quantity) * kg_per_unit[unit]
+    return float(quantity) * kg_per_unit[unit]
+
+
+def compare_weight_parsing(rows, seed=0):
+    '''
+    Times DataCleaning.parse_weight against convert_to_kg, the per-value parsing it replaced,
+    on the weight column of a synthetic products table without garbage rows (the per-value
+    parsing can't handle those), and checks both give the same kilograms.
+
+    Parameters:
+    -----------
+        rows: int
+            the number of weights
+
+        seed: int
+            the seed of the synthetic data
+
+    Returns:
+    --------
+        result: dict
+            the seconds taken by each version and the speedup
+
+    Raises:
+    -------
+        ValueError: If the two versions give different weights.
+    '''
+    weights = SyntheticData(seed, garbage_rate=0).products(rows)['weight']
+    start_time = time.perf_counter()
+    per_value_kg = weights.apply(convert_to_kg)
+    per_value_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    weight_kg, valid_weight_mask = DataCleaning.parse_weight(weights)
+    vectorised_seconds = time.perf_counter() - start_time
+    if not np.allclose(weight_kg.where(valid_weight_mask), per_value_kg, equal_nan=True):
+        raise ValueError("parse_weight doesn't match convert_to_kg")
+    result = {
+        'rows': rows,
+        'per_value_seconds': round(per_value_seconds, 4),
+        'vectorised_seconds': round(vectorised_seconds, 4),
+        'speedup': round(per_value_seconds / vectorised_seconds, 1) if vectorised_seconds else None,
+    }
+    print(f"{'parse_weight':<25} {rows:>9} rows  per value {per_value_seconds:>8.3f}s  "
+          f"vectorised {vectorised_seconds:>8.3f}s  ({result['speedup']}x)")
+    return result
+
+
+def run_benchmarks(sizes, names=None, seed=0, workers=None):
+    '''
+    Runs every cleaning method at every size.
+
+    Parameters:
+    -----------
+        sizes: list
+            the numbers of rows to benchmark
+
+        names: list
+            the cleaning methods to run (all of them if None)
+
+        seed: int
+            the seed of the synthetic data
+
+        workers: int
+            the number of processes cleaning the rows of each table (see DataCleaning)
+
+    Returns:
+    --------
+        results: dict
+            the measurements keyed by method name, then by size
+    '''
+    data = SyntheticData(seed)
+    results = {}
+    for name, (table, method) in cleaners().items():
+        if names and name not in names:
+            continue
+        results[name] = {}
+        for rows in sizes:
+            result = measure(getattr(data, table), getattr(DataCleaning(workers=workers), method), rows)
+            results[name][str(rows)] = result
+            print(f"{name:<25} {rows:>9} rows  {result['seconds']:>9.3f}s  "
+                  f"{result['rows_per_second'] or 0:>11} rows/s  {result['peak_memory_mb']:>9.1f} MB")
+    return results
+
+
+def find_regressions(results, baseline, tolerance=0.2):
+    '''
+    Compares the results with the baseline. A method regresses if it is slower, or its peak memory
+    higher, than the baseline by more than the tolerance.
+
+    Parameters:
+    -----------
+        results: dict
+            the new measurements
+
+        baseline: dict
+            the measurements of the baseline
+
+        tolerance: float
+            the allowed relative increase (0.2 is 20%)
+
+    Returns:
+    --------
+        regressions: list
+            a description of every regression
+    '''
+    regressions = []
+    for name, sizes in results.items():
+        for rows, result in sizes.items():
+            previous = baseline.get(name, {}).get(rows)
+            if previous is None:
+                continue
+            for metric in ('seconds', 'peak_memory_mb'):
+                if previous[metric] and result[metric] > previous[metric] * (1 + tolerance):
+                    regressions.append(f"{name} at {rows} rows: {metric} went from {previous[metric]} "
+                                       f"to {result[metric]}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the DataCleaning methods on synthetic data.")
+    parser.add_argument('--sizes', default='10000,100000,1000000', help="comma separated numbers of rows")
+    parser.add_argument('--cleaners', help="comma separated cleaning methods to run (default: all)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, help="clean the rows of large tables in this many processes")
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help="json file of the baseline")
+    parser.add_argument('--update-baseline', action='store_true', help="save the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative slowdown before flagging")
+    parser.add_argument('--compare-weights', type=int, metavar='ROWS',
+                        help="only compare parse_weight with the per-value weight helpers on this many rows")
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+    if args.compare_weights:
+        compare_weight_parsing(args.compare_weights, args.seed)
+        raise SystemExit(0)
+    results = run_benchmarks([int(size) for size in args.sizes.split(',')],
+                             args.cleaners.split(',') if args.cleaners else None, args.seed, args.workers)
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=4)
+        print(f"Saved the baseline to {args.baseline}")
+    else:
+        with open(args.baseline, 'r') as file:
+            regressions = find_regressions(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            raise SystemExit(1)
+        print("No regressions against the baseline")
@@ -0,0 +1,151 @@
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+from cleaning_plan import add_nan_masks, restore_nan_masks
+
+
+class CheckpointStore:
+    '''
+    Checkpoint Store class saves the output of each pipeline stage (e.g. the raw and the cleaned
+    dataframe of every table) under a run directory, so a failed run can be resumed without
+    extracting and cleaning everything again.
+
+    Dataframes are saved as Arrow IPC files and loaded back memory-mapped, keeping the NaN of
+    object columns apart from None (see cleaning_plan.add_nan_masks). Dataframes Arrow
+    can't represent (e.g. columns mixing numbers and strings) are pickled instead. Other
+    outputs (e.g. the orders watermark) are saved as json.
+
+    Attributes:
+    ----------
+    run_dir: str
+        the directory holding the checkpoints of the run
+
+    resume: bool
+        if True, stages whose checkpoint exists are loaded instead of being run
+
+    Methods:
+    -------
+    save(df, table_name, stage)
+        saves the dataframe or value of a stage
+
+    load(table_name, stage)
+        loads the dataframe or value of a stage or returns None if there is no checkpoint
+
+    wrap(table_name, stage, func)
+        wraps a stage function so its result is checkpointed
+    '''
+    def __init__(self, run_dir, resume=False):
+        self.run_dir = run_dir
+        self.resume = resume
+        os.makedirs(self.run_dir, exist_ok=True)
+
+    def path(self, table_name, stage, extension):
+        '''
+        returns the path of the checkpoint file of a stage
+        '''
+        return os.path.join(self.run_dir, f"{table_name}.{stage}.{extension}")
+
+    def save(self, df, table_name, stage):
+        '''
+        saves the dataframe of a stage. The file is written under a temporary name first so
+        an interrupted save never looks like a finished checkpoint.
+
+        Parameters:
+        -----------
+        df: DataFrame, int or str
+            the output of the stage
+
+        table_name: str
+            the name of the table
+
+        stage: str
+            the name of the stage (e.g. 'raw' or 'cleaned')
+        '''
+        arrow_path = self.path(table_name, stage, 'arrow')
+        pickle_path = self.path(table_name, stage, 'pkl')
+        json_path = self.path(table_name, stage, 'json')
+        for old_path in (arrow_path, pickle_path, json_path):
+            if os.path.exists(old_path):
+                os.remove(old_path)
+        if not isinstance(df, pd.DataFrame):
+            with open(f"{json_path}.tmp", 'w') as file:
+                json.dump(df.item() if hasattr(df, 'item') else df, file)
+            os.replace(f"{json_path}.tmp", json_path)
+            return
+        try:
+            table = pa.Table.from_pandas(add_nan_masks(df), preserve_index=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            print(f"Saving the {stage} {table_name} checkpoint as a pickle: {e}")
+            df.to_pickle(f"{pickle_path}.tmp")
+            os.replace(f"{pickle_path}.tmp", pickle_path)
+            return
+        with pa.OSFile(f"{arrow_path}.tmp", 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(f"{arrow_path}.tmp", arrow_path)
+
+    def load(self, table_name, stage):
+        '''
+        loads the dataframe of a stage
+
+        Parameters:
+        -----------
+        table_name: str
+            the name of the table
+
+        stage: str
+            the name of the stage (e.g. 'raw' or 'cleaned')
+
+        Returns:
+        --------
+        df: DataFrame, int, str or None
+            the saved output of the stage, None if it has no checkpoint
+        '''
+        arrow_path = self.path(table_name, stage, 'arrow')
+        pickle_path = self.path(table_name, stage, 'pkl')
+        json_path = self.path(table_name, stage, 'json')
+        if os.path.exists(json_path):
+            with open(json_path, 'r') as file:
+                return json.load(file)
+        if os.path.exists(arrow_path):
+            with pa.memory_map(arrow_path, 'r') as source:
+                return restore_nan_masks(pa.ipc.open_file(source).read_all().to_pandas())
+        if os.path.exists(pickle_path):
+            return pd.read_pickle(pickle_path)
+        return None
+
+    def wrap(self, table_name, stage, func):
+        '''
+        wraps a stage function. When resuming, the saved output is returned if there is one;
+        otherwise the function is run and its output saved before it is returned.
+
+        Parameters:
+        -----------
+        table_name: str
+            the name of the table
+
+        stage: str
+            the name of the stage (e.g. 'raw' or 'cleaned')
+
+        func: function
+            the stage function returning a dataframe or a json value
+
+        Returns:
+        --------
+        checkpointed_func: function
+            the wrapped stage function
+        '''
+        def checkpointed_func(*args):
+            if self.resume:
+                df = self.load(table_name, stage)
+                if df is not None:
+                    print(f"Resuming {table_name} from its {stage} checkpoint")
+                    return df
+            df = func(*args)
+            if df is not None:
+                self.save(df, table_name, stage)
+            return df
+        return checkpointed_func
@@ -0,0 +1,531 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+NULL_TOKENS = ['NULL', 'N/A']
+EMAIL_PATTERN = r"^[\w!#$%&'*+/=?`{|}~^-]+(?:\.[\w!#$%&'*+/=?`{|}~^-]+)*@(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]*[a-zA-Z0-9])?\.)+[a-zA-Z0-9](?:[a-zA-Z0-9-]*[a-zA-Z0-9])?$"
+LONGITUDE_PATTERN = r"^(\+|-)?(?:180(?:(?:\.0{1,6})?)|(?:[0-9]|[1-9][0-9]|1[0-7][0-9])(?:(?:\.[0-9]{1,6})?))$"
+LATITUDE_PATTERN = r"^(\+|-)?(?:90(?:(?:\.0{1,6})?)|(?:[0-9]|[1-8][0-9])(?:(?:\.[0-9]{1,6})?))$"
+STORE_TYPE_CODE_PATTERN = r'[A-Z0-9]{10}$'
+PHONE_PREFIX_PATTERN = r'\+44\(0\)|\+1|\+49\(0\)'
+NAN_MASK_PREFIX = '__nan__'
+
+# The cleaning spec of each table. A spec can have the following keys, applied in this order:
+#
+#   quarantine: list
+#       columns whose rows are moved to DataCleaning.quarantine when the value has more than one digit
+#   columns: dict
+#       the rules of each column, applied in order in a single pass over the column's distinct values
+#   dropna: 'all' or list
+#       the rows with a missing value in any column (or in the listed columns) are dropped
+#   drop_columns: list
+#       the columns removed from the cleaned table
+#   finally: dict
+#       column rules applied to the rows that are left (e.g. derived columns)
+#   rename: dict
+#       the new name of each renamed column
+#   reset_index: bool
+#       if True, the index is moved to an 'index' column
+#
+# The column rules are tuples naming the rule and its arguments:
+#
+#   ('str',)                          convert the values to strings ('nan' for missing values)
+#   ('replace', old, new)             replace a substring
+#   ('regex_replace', pattern, new)   replace a regular expression
+#   ('nulls',)                        replace 'NULL' and 'N/A' with NaN
+#   ('match', pattern)                set the values not matching the pattern to NaN
+#   ('reject', pattern)               set the values matching the pattern to NaN
+#   ('dates',)                        parse with DataCleaning.date_formats, NaT if invalid
+#   ('time',)                         parse with DataCleaning.time_formats and keep as HH:MM:SS
+#   ('apply', name)                   apply a DataCleaning helper to each value (e.g. 'isyear')
+#   ('phone', pattern)                normalise phone numbers, replacing the pattern's country prefixes
+#   ('weight',)                       convert weights to kg, NaN if invalid
+#   ('map', mapping)                  map each value through a dict, NaN if it isn't a key
+#   ('coalesce', column)              fill the missing values from another column (first rule only)
+#   ('from', column)                  start from another column's values (first rule only)
+#   ('bins', edges, labels)           group the values into labelled bins [edge, next edge)
+CLEANING_SPECS = {
+    'dim_users': {
+        'columns': {
+            'date_of_birth': [('dates',)],
+            'email_address': [('replace', '@@', '@'), ('str',), ('match', EMAIL_PATTERN)],
+            'address': [('str',), ('replace', '\n', ' ')],
+            'join_date': [('dates',)],
+            'country_code': [('str',), ('replace', 'GG', 'G'), ('nulls',)],
+            'phone_number': [('phone', PHONE_PREFIX_PATTERN)],
+            'first_name': [('nulls',)],
+            'country': [('nulls',)],
+        },
+        'dropna': 'all',
+    },
+    'dim_card_details': {
+        'columns': {
+            'card_number': [('str',), ('replace', '?', ''), ('apply', 'check_credit_card_length')],
+            'date_payment_confirmed': [('dates',)],
+        },
+        'dropna': 'all',
+    },
+    'dim_products': {
+        'quarantine': ['category', 'removed'],
+        'columns': {
+            'category': [('str',)],
+            'product_price': [('str',), ('replace', '£', '')],
+            'removed': [('str',)],
+            'date_added': [('dates',)],
+            'weight': [('weight',)],
+        },
+        'dropna': 'all',
+        'drop_columns': ['Unnamed: 0'],
+        'finally': {
+            'removed': [('map', {'Still_avaliable': True, 'Removed': False})],
+            'weight_class': [('from', 'weight'),
+                             ('bins', [-np.inf, 2, 40, 140, np.inf], ['Light', 'Mid_Sized', 'Heavy', 'Truck_Required'])],
+        },
+        'rename': {'removed': 'still_available'},
+    },
+    'dim_store_details': {
+        'quarantine': ['locality'],
+        'columns': {
+            'address': [('str',), ('replace', '\n', ' ')],
+            'longitude': [('match', LONGITUDE_PATTERN)],
+            'locality': [('str',)],
+            'latitude': [('coalesce', 'lat'), ('match', LATITUDE_PATTERN)],
+            'store_code': [('nulls',)],
+            'staff_numbers': [('regex_replace', '[a-zA-Z]', ''), ('replace', '    ', 'NULL'), ('nulls',)],
+            'opening_date': [('dates',)],
+            'store_type': [('str',), ('reject', STORE_TYPE_CODE_PATTERN), ('nulls',)],
+            'continent': [('str',), ('replace', 'ee', '')],
+            'country_code': [('str',), ('replace', 'GG', 'G'), ('nulls',)],
+        },
+        'dropna': ['staff_numbers', 'opening_date', 'country_code', 'continent'],
+        'drop_columns': ['lat'],
+    },
+    'orders_table': {
+        'drop_columns': ['level_0', 'index', 'first_name', 'last_name', '1'],
+        'reset_index': True,
+    },
+    'dim_date_times': {
+        'columns': {
+            'timestamp': [('time',)],
+            'year': [('apply', 'isyear')],
+            'month': [('apply', 'ismonth')],
+            'day': [('apply', 'isdate')],
+        },
+        'dropna': 'all',
+    },
+}
+
+
+class CleaningPlan:
+    '''
+    Cleaning Plan class compiles the cleaning spec of a table into one function per column and
+    runs it. Each column is factorized once and all its rules run over its distinct values only,
+    then the results are mapped back to the rows, so a column is never copied or scanned once
+    per rule. Rows are filtered once, after every column is cleaned.
+
+    The column rules only depend on each row's own values, so when the DataCleaning has more
+    than one worker, large tables are split into row partitions that are cleaned at the same
+    time in a process pool. The partitions go to and from the workers as Arrow streams in
+    shared memory, and are put back together in order before the rows are filtered.
+
+    Attributes:
+    ----------
+    spec: dict
+        the cleaning spec of the table (see CLEANING_SPECS)
+
+    cleaning: DataCleaning
+        provides the date formats, the value helpers and the quarantine
+
+    Methods:
+    -------
+    compile_rules(rules)
+        returns the rules as a list of functions, with redundant rules removed
+
+    clean_column(df, rules)
+        applies the compiled rules of a column over its distinct values
+
+    clean_columns(df)
+        applies the rules of every column, in row partitions across the workers if it's large
+
+    run(df)
+        cleans the dataframe
+    '''
+    def __init__(self, spec, cleaning):
+        unknown_keys = set(spec) - {'quarantine', 'columns', 'dropna', 'drop_columns', 'finally', 'rename', 'reset_index'}
+        if unknown_keys:
+            raise ValueError(f"Unknown cleaning spec keys: {sorted(unknown_keys)}")
+        self.spec = spec
+        self.cleaning = cleaning
+        self.columns = {column: self.compile_rules(rules) for column, rules in spec.get('columns', {}).items()}
+        self.final_columns = {column: self.compile_rules(rules) for column, rules in spec.get('finally', {}).items()}
+
+    def compile_rules(self, rules):
+        '''
+        compiles the rules of a column. Repeated 'str' rules and consecutive 'nulls' rules are
+        merged, and a 'str' rule just before a 'reject' rule (which converts the values to
+        strings itself) is dropped.
+
+        Parameters:
+        -----------
+        rules: list
+            the rule tuples of the column
+
+        Returns:
+        --------
+        source: tuple or None
+            the ('coalesce' or 'from', column) rule, run on the whole column before factorizing
+
+        functions: list
+            the functions applied in turn to the distinct values
+        '''
+        source = None
+        if rules and rules[0][0] in ('coalesce', 'from'):
+            source, rules = rules[0], rules[1:]
+        merged_rules = []
+        for rule in rules:
+            if merged_rules and rule[0] in ('str', 'nulls') and merged_rules[-1][0] == rule[0]:
+                continue
+            merged_rules.append(rule)
+        functions = []
+        for index, rule in enumerate(merged_rules):
+            name, *args = rule
+            next_rule = merged_rules[index + 1][0] if index + 1 < len(merged_rules) else None
+            if name == 'str':
+                if next_rule != 'reject':
+                    functions.append(lambda values: values.astype(str))
+            elif name == 'replace':
+                functions.append(lambda values, old=args[0], new=args[1]: values.str.replace(old, new, regex=False))
+            elif name == 'regex_replace':
+                functions.append(lambda values, pattern=args[0], new=args[1]: values.str.replace(pattern, new, regex=True))
+            elif name == 'nulls':
+                functions.append(lambda values: values.replace(NULL_TOKENS, np.nan))
+            elif name == 'match':
+                functions.append(lambda values, pattern=args[0]: values.where(values.astype(str).str.match(pattern)))
+            elif name == 'reject':
+                functions.append(lambda values, pattern=args[0]: values.astype(str).where(
+                    ~values.astype(str).str.match(pattern)))
+            elif name == 'dates':
+                functions.append(lambda values: self.cleaning.parse_dates(values, self.cleaning.date_formats))
+            elif name == 'time':
+                functions.append(lambda values: self.cleaning.parse_dates(
+                    values, self.cleaning.time_formats).dt.strftime('%H:%M:%S'))
+            elif name == 'apply':
+                functions.append(lambda values, helper=getattr(self.cleaning, args[0]): values.apply(helper))
+            elif name == 'phone':
+                functions.append(lambda values, pattern=args[0]: self.cleaning.normalise_phone_numbers(values, pattern))
+            elif name == 'weight':
+                functions.append(lambda values: self.cleaning.parse_weight(values)[0])
+            elif name == 'map':
+                functions.append(lambda values, mapping=args[0]: values.map(mapping))
+            elif name == 'bins':
+                functions.append(lambda values, edges=args[0], labels=args[1]: pd.cut(
+                    values, edges, right=False, labels=labels).astype(object))
+            else:
+                raise ValueError(f"Unknown cleaning rule {rule!r}")
+        return source, functions
+
+    @staticmethod
+    def clean_column(df, column, compiled_rules):
+        '''
+        applies the compiled rules of a column. The rules run once per distinct value; missing
+        values are kept apart by type (None, NaN, NaT...) because the rules can treat them
+        differently (e.g. 'str' turns None into 'None' and NaN into 'nan').
+
+        Parameters:
+        -----------
+        df: DataFrame
+            the table being cleaned
+
+        column: str
+            the name of the column
+
+        compiled_rules: tuple
+            the (source, functions) returned by compile_rules
+
+        Returns:
+        --------
+        values: Series
+            the cleaned column
+        '''
+        source, functions = compiled_rules
+        if source is None:
+            values = df[column]
+        elif source[0] == 'coalesce':
+            values = df[column].where(df[column].notna(), df[source[1]])
+        else:
+            values = df[source[1]].rename(column)
+        codes, uniques = pd.factorize(values)
+        distinct_values = list(uniques)
+        missing = codes == -1
+        if missing.any():
+            missing_values = values.to_numpy()[missing]
+            kind_codes, kinds = pd.factorize(np.frompyfunc(type, 1, 1)(missing_values))
+            first_of_kind = np.unique(kind_codes, return_index=True)[1]
+            codes[missing] = len(distinct_values) + kind_codes
+            distinct_values.extend(missing_values[first_of_kind])
+        distinct = pd.Series(distinct_values, dtype=values.dtype, name=column)
+        for function in functions:
+            distinct = function(distinct)
+        return pd.Series(distinct.to_numpy()[codes], index=values.index, name=column, dtype=distinct.dtype)
+
+    def clean_columns(self, df):
+        '''
+        applies the rules of every column. If the cleaning has more than one worker and the
+        table has enough rows, the rows are split into one partition per worker, the partitions
+        are cleaned in a process pool and the cleaned columns are concatenated in row order.
+
+        Parameters:
+        -----------
+        df: DataFrame
+            the table being cleaned
+
+        Returns:
+        --------
+        df: DataFrame
+            the table with its columns cleaned
+        '''
+        workers = self.cleaning.workers or 1
+        number_of_partitions = min(workers, len(df) // self.cleaning.partition_rows)
+        if number_of_partitions < 2 or not self.columns:
+            for column, compiled_rules in self.columns.items():
+                df[column] = self.clean_column(df, column, compiled_rules)
+            return df
+        rules = self.spec['columns']
+        used_columns = list(dict.fromkeys(
+            [column for column, column_rules in rules.items() if column_rules[0][0] != 'from'] +
+            [column_rules[0][1] for column_rules in rules.values() if column_rules[0][0] in ('coalesce', 'from')]))
+        bounds = np.linspace(0, len(df), number_of_partitions + 1).astype(int)
+        partitions = []
+        try:
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                partition = df.iloc[start:stop][used_columns]
+                shared_frame = write_shared_frame(partition)
+                partitions.append(partition if shared_frame is None else shared_frame)
+            # spawn instead of fork, as this may run alongside other threads of the pipeline
+            with ProcessPoolExecutor(max_workers=number_of_partitions,
+                                     mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=init_worker,
+                                     initargs=(self.cleaning.date_formats, self.cleaning.time_formats)) as executor:
+                results = list(executor.map(clean_partition, [rules] * len(partitions),
+                                            [partition if isinstance(partition, pd.DataFrame)
+                                             else (partition[0].name, partition[1]) for partition in partitions]))
+        finally:
+            for partition in partitions:
+                if not isinstance(partition, pd.DataFrame):
+                    partition[0].close()
+                    partition[0].unlink()
+        cleaned = pd.concat([result if isinstance(result, pd.DataFrame) else read_shared_frame(*result, unlink=True)
+                             for result in results], ignore_index=True)
+        cleaned.index = df.index
+        for column in self.columns:
+            df[column] = cleaned[column]
+        return df
+
+    def run(self, df):
+        '''
+        cleans the dataframe: quarantines the rejected rows, cleans every column, drops the
+        rows with missing values, then runs the final column rules, renames and index reset.
+
+        Parameters:
+        -----------
+        df: DataFrame
+            the table to be cleaned
+
+        Returns:
+        --------
+        df: DataFrame
+            the cleaned table
+        '''
+        # the quarantined rows are removed first so the column rules don't run on them
+        keep = np.ones(len(df), dtype=bool)
+        for column in self.spec.get('quarantine', []):
+            rejected = keep & (df[column].astype(str).str.count(r'\d') > 1).to_numpy()
+            if rejected.any():
+                self.cleaning.add_to_quarantine(column, df[rejected])
+                keep &= ~rejected
+        if not keep.all():
+            df = df.take(np.flatnonzero(keep))
+        df = self.clean_columns(df)
+        dropna = self.spec.get('dropna')
+        if dropna is not None:
+            keep = (df if dropna == 'all' else df[dropna]).notna().all(axis=1).to_numpy()
+            if not keep.all():
+                df = df.take(np.flatnonzero(keep))
+        if self.spec.get('drop_columns'):
+            df = df.drop(columns=self.spec['drop_columns'], errors='ignore')
+        for column, compiled_rules in self.final_columns.items():
+            df[column] = self.clean_column(df, column, compiled_rules)
+        if self.spec.get('rename'):
+            df = df.rename(columns=self.spec['rename'])
+        if self.spec.get('reset_index'):
+            df = df.reset_index()
+        return df
+
+
+worker_cleaning = None
+
+
+def init_worker(date_formats, time_formats):
+    '''
+    Creates the DataCleaning used by a worker process to clean its partitions.
+
+    Parameters:
+    -----------
+    date_formats: list
+        the date formats of the parent's DataCleaning
+
+    time_formats: list
+        the time formats of the parent's DataCleaning
+    '''
+    global worker_cleaning
+    from data_cleaning import DataCleaning
+    worker_cleaning = DataCleaning(date_formats, time_formats)
+
+
+def clean_partition(rules, partition):
+    '''
+    Cleans the columns of one row partition. This runs in a worker process, so it has to be
+    a module level function.
+
+    Parameters:
+    -----------
+    rules: dict
+        the column rules of the cleaning spec
+
+    partition: tuple or DataFrame
+        the (name, size) of the shared memory holding the partition, or the partition itself
+        if it couldn't be converted to Arrow
+
+    Returns:
+    --------
+    result: tuple or DataFrame
+        the (name, size) of the shared memory holding the cleaned columns, or the cleaned
+        columns themselves if they couldn't be converted to Arrow
+    '''
+    df = partition if isinstance(partition, pd.DataFrame) else read_shared_frame(*partition)
+    plan = CleaningPlan({'columns': rules}, worker_cleaning)
+    cleaned = pd.DataFrame({column: plan.clean_column(df, column, compiled_rules)
+                            for column, compiled_rules in plan.columns.items()})
+    shared_frame = write_shared_frame(cleaned)
+    if shared_frame is None:
+        return cleaned
+    shared_frame[0].close()
+    return shared_frame[0].name, shared_frame[1]
+
+
+def add_nan_masks(df):
+    '''
+    Arrow stores NaN and None in object columns as the same null, so this function adds a
+    boolean column marking where each object column holds NaN, to be restored by
+    restore_nan_masks once the dataframe is read back from Arrow.
+
+    Parameters:
+    -----------
+    df: DataFrame
+        the dataframe
+
+    Returns:
+    --------
+    frame: DataFrame
+        a shallow copy of the dataframe with the mask columns added at the end
+    '''
+    frame = df.copy(deep=False)
+    for column in df.columns:
+        if df[column].dtype == object:
+            values = df[column].to_numpy()
+            missing = pd.isna(values)
+            if missing.any():
+                is_nan = np.zeros(len(values), dtype=bool)
+                is_nan[missing] = [isinstance(value, float) for value in values[missing]]
+                frame[f"{NAN_MASK_PREFIX}{column}"] = is_nan
+    return frame
+
+
+def restore_nan_masks(df):
+    '''
+    Puts back the NaN marked by add_nan_masks and removes the mask columns.
+
+    Parameters:
+    -----------
+    df: DataFrame
+        the dataframe read back from Arrow
+
+    Returns:
+    --------
+    df: DataFrame
+        the dataframe with its NaN restored
+    '''
+    for mask_column in [column for column in df.columns if str(column).startswith(NAN_MASK_PREFIX)]:
+        column = mask_column[len(NAN_MASK_PREFIX):]
+        df[column] = df[column].where(~df.pop(mask_column), np.nan)
+    return df
+
+
+def write_shared_frame(df):
+    '''
+    Writes a dataframe into a new block of shared memory as an Arrow stream, so another
+    process can read it without it being pickled. The NaN of object columns are kept with
+    add_nan_masks.
+
+    Parameters:
+    -----------
+    df: DataFrame
+        the dataframe, whose index isn't kept
+
+    Returns:
+    --------
+    shared_frame: tuple or None
+        the SharedMemory and the size of the stream, None if the dataframe can't be converted
+        to Arrow (e.g. a column mixing numbers and strings)
+    '''
+    try:
+        table = pa.Table.from_pandas(add_nan_masks(df), preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return None
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    size = sink.size()
+    shared = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    buffer = pa.py_buffer(shared.buf)
+    with pa.ipc.new_stream(pa.FixedSizeBufferWriter(buffer), table.schema) as writer:
+        writer.write_table(table)
+    del buffer
+    return shared, size
+
+
+def read_shared_frame(name, size, unlink=False):
+    '''
+    Reads a dataframe written by write_shared_frame.
+
+    Parameters:
+    -----------
+    name: str
+        the name of the shared memory
+
+    size: int
+        the size of the Arrow stream
+
+    unlink: bool
+        if True, the shared memory is freed once it's read
+
+    Returns:
+    --------
+    df: DataFrame
+        the dataframe, with a new RangeIndex
+    '''
+    shared = shared_memory.SharedMemory(name=name)
+    try:
+        buffer = pa.py_buffer(shared.buf)[:size]
+        df = restore_nan_masks(pa.ipc.open_stream(buffer).read_all().to_pandas())
+        del buffer
+    finally:
+        shared.close()
+        if unlink:
+            shared.unlink()
+    return df
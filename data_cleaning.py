@@ -1,13 +1,44 @@
 import numpy as np
 import pandas as pd
-import re
+
+from cleaning_plan import CLEANING_SPECS, CleaningPlan
 
 class DataCleaning:
     '''
     A Data Cleaning class that cleans the dataframe and returns a cleaned dataframe.
 
+    Attributes:
+    ----------
+    date_formats: list
+        the date formats tried, in order, when parsing date columns
+
+    time_formats: list
+        the time formats tried, in order, when parsing the timestamp column
+
+    quarantine: dict
+        the batches of rows rejected by the cleaning plans, keyed by column name (see quarantined_rows)
+
+    category_ratio: float
+        text columns with at most this ratio of distinct values to rows become categoricals
+
+    memory_report: dict
+        the memory used by each table before and after compact_dtypes, keyed by table name
+
+    plans: dict
+        the compiled CleaningPlan of each table in cleaning_plan.CLEANING_SPECS
+
+    workers: int
+        the number of processes cleaning the columns of a large table at the same time
+        (None or 1 cleans them in this process)
+
+    partition_rows: int
+        the least number of rows of each partition, so small tables aren't split
+
     Methods:
     -------
+    clean_table(df, table_name)
+        Cleans a table with its compiled cleaning plan
+
     clean_user_data(df)
         Cleans the legacy_user table from the AWS RDS 
     
@@ -26,69 +57,27 @@ class DataCleaning:
     clean_event_date(df):
         Clean date event data from url (AWS s3 bucket)
 
-    clean_longitude(df)
-         Cleans the address column from a DataFrame
-
-    clean_store_type(df)
-        Cleans the store type column from a DataFrame
-
-    clean_email(df)
-        Cleans the email column from a DataFrame
-
-    clean_card_number(df)
-        Cleans the card number column from a DataFrame
-    
-    clean_phone_number(regex, df)
-        Cleans the phone number column from a DataFrame
-
-    clean_non_numerical_data(df, column_name):
-        Clean the column of all digits for charcter only stringcolumns
-
-    clean_weight(df)
-        Clean the weight column
-
-    clean_month(df)
-        Clean the month column
-
-    clean_year(df)
-        Clean the year column
-
-    clean_day(df)
-        Clean the day column
+    compact_dtypes(df, table_name)
+        Converts the cleaned columns to categoricals, the narrowest numeric types and Arrow strings
 
     
 
     HELPER FUNCTION
 
-    remove_char_from_digit(df, column_name)
-        Remove character from a string of digits from a column. 
-        Assuming that the digits datatype is strings
+    normalise_phone_numbers(phone_numbers, regex)
+        Replaces the country prefixes and removes brackets, dots and spaces from phone numbers
 
-    phone_number_plus(regex, phone_number_string)
-        Checks if the first 2/3 numbers are either +1, +44(0) or +49(0), ammends the string
-        and return the new number
+    phone_number_e164(phone_numbers, country_codes)
+        Converts cleaned phone numbers to E.164 format, NaN if invalid for the country
 
 
-    clear_null(df, column_name)
-        Changes the string such as 'NULL' and 'N/A' to NaN Values 
-
-    replace_string(df, column_name, string_from, string_to)
-        replaces a string with another
-
     check_credit_card_length(card_number)
         Check the card number length and return either NaN or the card number if the 
         value meets the condition.
     
-    weight_validator(weight_string)
-        Check if the weight column follows a similar format
-    
-    convert_to_grams(metric_string)
-        Converts the weight metrics to kg
+    parse_weight(weights)
+        Converts a whole weight column to kg and returns it with a validity mask
 
-    check_sum_digit(string)
-        Check if the number of digit in a string exceed one
-        For only letter/character string
-    
     isyear(year_string)
         Check if the year(string) has 4 digits
     
@@ -98,9 +87,43 @@ class DataCleaning:
     isdate(day_string)
         Check if the day number(string) is between 1-31
 
+    parse_dates(values, formats)
+        Parse a column of dates by trying each format in turn over the distinct values
+
+    quarantined_rows()
+        Returns all the rejected rows of each column as one dataframe
+
     '''
-    def __init__(self):
-        pass
+    def __init__(self, date_formats=None, time_formats=None, category_ratio=0.5, workers=None, partition_rows=100000):
+        if workers is not None and workers < 1:
+            raise ValueError(f"workers must be at least 1, not {workers}")
+        self.date_formats = date_formats or ['ISO8601', '%Y %B %d', '%B %Y %d', '%Y/%m/%d']
+        self.time_formats = time_formats or ['%H:%M:%S', '%H:%M:%S.%f']
+        self.category_ratio = category_ratio
+        self.workers = workers
+        self.partition_rows = partition_rows
+        self.quarantine = {}
+        self.memory_report = {}
+        self.plans = {table_name: CleaningPlan(spec, self) for table_name, spec in CLEANING_SPECS.items()}
+
+    def clean_table(self, df, table_name):
+        '''
+        This function cleans a table with the cleaning plan compiled from its spec in
+        cleaning_plan.CLEANING_SPECS. Rows rejected by the spec are added to the quarantine.
+
+        Parameters:
+        ----------  
+            df: DataFrame
+                the dataframe to be cleaned
+            table_name: string
+                the name of the table in CLEANING_SPECS (e.g. 'dim_users')
+
+        Returns:
+        --------
+            df: DataFrame
+                the cleaned dataframe 
+        '''
+        return self.plans[table_name].run(df)
 
     def clean_user_data(self, df):
         '''
@@ -118,18 +141,8 @@ class DataCleaning:
                 the cleaned dataframe 
         
         '''
-        self.clean_invalid_date(df, 'date_of_birth')
-        self.clean_email(df)
-        self.replace_string(df, 'address', '\n', ' ')
-        self.clean_invalid_date(df, 'join_date')
-        self.replace_string(df, 'country_code', 'GG', 'G')
-        self.clean_phone_number(df, r'\+44\(0\)|\+1|\+49\(0\)')
-        self.clear_null(df, 'first_name')
-        self.clear_null(df, 'country')
-        self.clear_null(df, 'country_code')
-        df.dropna(inplace=True)
-        return df
-    
+        return self.clean_table(df, 'dim_users')
+
     def clean_card_data(self, df):
         '''
         This function cleans the card data Dataframe imported a pdf from AWS s3 bucket
@@ -146,12 +159,7 @@ class DataCleaning:
                 the cleaned dataframe 
         
         '''
-        self.replace_string(df,'card_number', "?", "")
-        self.clean_card_number(df)
-        self.clean_invalid_date(df, 'date_payment_confirmed')
-        df.dropna(inplace=True)
-        return df
-
+        return self.clean_table(df, 'dim_card_details')
 
     def clean_products_data(self, df):
         '''
@@ -169,17 +177,7 @@ class DataCleaning:
                 the cleaned dataframe 
         
         '''
-
-        self.clean_non_numerical_data(df, 'category')
-        self.replace_string(df, 'product_price', '£', '')
-        self.clean_non_numerical_data(df, 'removed')
-        self.clean_invalid_date(df, 'date_added')
-        df.dropna(inplace=True)
-        self.clean_weight(df)
-        df.drop(columns=['Unnamed: 0'], inplace=True)
-        df.dropna(inplace=True)
-
-        return df
+        return self.clean_table(df, 'dim_products')
 
     def clean_orders_data(self, df):
         '''
@@ -197,10 +195,7 @@ class DataCleaning:
                 the cleaned dataframe  
         
         '''
-        df.drop(columns=["level_0", 'index', "first_name", "last_name", '1'],errors='ignore', axis=1, inplace=True)
-        df = df.reset_index()
-        return df
-
+        return self.clean_table(df, 'orders_table')
 
     def called_clean_store_data(self, df):
         '''
@@ -218,20 +213,8 @@ class DataCleaning:
                 the cleaned dataframe
         
         '''
-        self.replace_string(df, 'address', '\n', ' ')
-        self.clean_longitude(df)
-        self.clean_non_numerical_data(df, 'locality')
-        self.clean_latitude(df)
-        self.clear_null(df, 'store_code')
-        self.clean_staff_number(df)
-        self.clear_null(df, 'staff_numbers')
-        self.clean_invalid_date(df, 'opening_date')
-        self.clean_store_type(df)
-        self.replace_string(df, 'continent', 'ee', '')
-        self.replace_string(df, 'country_code', 'GG', 'G')
-        df.dropna(subset=['staff_numbers', 'opening_date', 'country_code', 'continent'], inplace=True)
-        return df
-    
+        return self.clean_table(df, 'dim_store_details')
+
     def clean_event_date(self, df):
         '''
         This function cleans the events data Dataframe which was imported from url (From AWS s3). 
@@ -247,267 +230,179 @@ class DataCleaning:
              df: DataFrame
                 the cleaned dataframe
         '''
-        self.clean_invalid_date(df, 'timestamp')
-        self.clean_year(df)
-        self.clean_month(df)
-        self.clean_day(df)
-        df.dropna(inplace=True)
-        return df
-
-
-
-    def clean_longitude(self,df):
-        '''
-        This function cleans the longitude column and checks if it follows 
-        the longitude patterm, if not the specified row is set to NaN.
-        Parameters:
-        ----------  
-            df: DataFrame
-                the dataframe to be cleaned    
-        '''
-        
-        pattern = r"^(\+|-)?(?:180(?:(?:\.0{1,6})?)|(?:[0-9]|[1-9][0-9]|1[0-7][0-9])(?:(?:\.[0-9]{1,6})?))$"
-        invalid_longitude_mask = ~df['longitude'].astype(str).str.match(pattern)
-        df.loc[invalid_longitude_mask, 'longitude'] = np.nan
+        return self.clean_table(df, 'dim_date_times')
 
-    def clean_staff_number(self, df):
+    def add_to_quarantine(self, column_name, rejected):
         '''
-        This function cleans the staff column and remove any characters from the number
-        (Assuming that the staff_number datatype is a string. )
-
+        This function adds rejected rows to the quarantine under the column that rejected them.
+        The batches are only concatenated once, by quarantined_rows, so a table cleaned in many
+        chunks isn't copied again on every chunk.
         Parameters:
         ----------  
-            df: DataFrame
-                the dataframe to be cleaned   
-        '''
-        df = self.remove_char_from_digit(df, 'staff_numbers')
-
-    def clean_invalid_date(self, df, column_name):
+            column_name: string
+                the column name
+            rejected: DataFrame
+                the rejected rows
         '''
-        This function cleans any column containing datetime datatypes. Anything that's incompatiable to the format
-        is set to NaN values.
+        self.quarantine.setdefault(column_name, []).append(rejected)
 
-        Parameters:
-        ----------  
-            df: DataFrame
-                the dataframe to be cleaned   
-        '''
-        df[column_name] = df[column_name].apply(pd.to_datetime,
-                                                infer_datetime_format=True,
-                                                errors='coerce')
-        
-        if column_name == 'timestamp':
-            df[column_name] = df[column_name].apply(pd.to_datetime,
-                                                errors='coerce').dt.strftime('%H:%M:%S')
-            
-    def clean_latitude(self, df):
-        '''
-        This function cleans the latitude column and checks if it follows 
-        the longitude patterm, if not the specified row is set to NaN.
-        Parameters:
-        ----------  
-            df: DataFrame
-                the dataframe to be cleaned    
+    def quarantined_rows(self):
         '''
-        pattern = r"^(\+|-)?(?:90(?:(?:\.0{1,6})?)|(?:[0-9]|[1-8][0-9])(?:(?:\.[0-9]{1,6})?))$"
-        invalid_latitude_mask = ~df['latitude'].astype(str).str.match(pattern)
-        df.loc[invalid_latitude_mask, 'latitude'] = np.nan
+        This function returns the rejected rows of each column, with the batches of every
+        column concatenated into one dataframe.
 
-    def clean_store_type(self, df):
-        '''
-        This function cleans the store type column and checks if contains a mixture of
-        numbers and characters. If so, the specified row is set to NaN. This function also 
-        remove 'NULL' or 'NaN' type of string.
-        Parameters:
-        ----------  
-            df: DataFrame
-                the dataframe to be cleaned    
+        Returns:
+        --------
+            quarantined: dict
+                the rejected rows, keyed by the column that rejected them
         '''
-        regex = r'[A-Z0-9]{10}$'
-        df['store_type'] = df['store_type'].astype(str)
-        df.loc[df['store_type'].str.match(regex), 'store_type'] = np.nan
-        self.clear_null(df, 'store_type')
+        return {column_name: pd.concat(batches) for column_name, batches in self.quarantine.items()}
 
-    def clean_email(self, df):
+    def compact_dtypes(self, df, table_name=None):
         '''
-        This function cleans the contient column by removing '@@' and 
-        replacing it with '@'. It then checks if follows the email format.
+        This function shrinks the memory used by a cleaned dataframe. Text columns with few
+        distinct values (e.g. country_code, store_type, month) become categoricals, the other
+        text columns become Arrow strings, integers are downcast to the
+        narrowest type and floats to float32 when no value changes. Columns mixing text and
+        numbers are left as they are. The memory saved is printed and kept in memory_report.
 
         Parameters:
         ----------  
             df: DataFrame
-                the dataframe to be cleaned  
+                the cleaned dataframe
+            table_name: string
+                the name of the table, used in the memory report
 
         Returns:
-            df: DataFrame  
-                the clean dataframe 
-        
-        '''
-        df['email_address'] = df['email_address'].str.replace("@@", "@")
-        regex = r"^[\w!#$%&'*+/=?`{|}~^-]+(?:\.[\w!#$%&'*+/=?`{|}~^-]+)*@(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]*[a-zA-Z0-9])?\.)+[a-zA-Z0-9](?:[a-zA-Z0-9-]*[a-zA-Z0-9])?$"
-        df['email_address'] = df['email_address'].astype(str)
-        df.loc[~df['email_address'].str.match(regex), 'email_address'] = np.nan
-        return df
-    
-    def clean_card_number(self, df):
-        df['card_number'] = df['card_number'].apply(self.check_credit_card_length)
-
-    def clean_phone_number(self, df, regex):
-        '''
-        This function cleans the phone number column.
-        '.'
-        Parameters:
-        ----------  
+        --------
             df: DataFrame
-                the dataframe to be cleaned
-            regex: string
-                the regular expression for values like +44(0), +49(0) and +1   
-        '''
-        regex = r'\+44\(0\)|\+1|\+49\(0\)'
-        df['phone_number'] = df['phone_number'].apply(lambda x: self.phone_number_plus(regex, x))
-        df['phone_number'] = df['phone_number'].replace({r'\(': '', r'\)': ''}, regex=True)
-        df['phone_number'] = df['phone_number'].str.replace('.', '').replace(' ','')
-        df['phone_number'] = df['phone_number'].str.replace(' ','')
+                the compacted dataframe
+        '''
+        memory_before = int(df.memory_usage(deep=True).sum())
+        for column_name in df.columns:
+            column = df[column_name]
+            if pd.api.types.is_integer_dtype(column) and not pd.api.types.is_bool_dtype(column):
+                df[column_name] = pd.to_numeric(column, downcast='integer')
+            elif pd.api.types.is_float_dtype(column):
+                narrow_column = column.astype('float32')
+                if narrow_column.astype(column.dtype).equals(column):
+                    df[column_name] = narrow_column
+            elif column.dtype == object and pd.api.types.infer_dtype(column, skipna=True) == 'string':
+                if column.nunique() <= self.category_ratio * len(column):
+                    df[column_name] = column.astype('category')
+                else:
+                    df[column_name] = column.astype(pd.StringDtype('pyarrow'))
+        memory_after = int(df.memory_usage(deep=True).sum())
+        if table_name is not None:
+            self.memory_report[table_name] = {
+                'before_mb': round(memory_before / 1024 ** 2, 2),
+                'after_mb': round(memory_after / 1024 ** 2, 2),
+                'saved_mb': round((memory_before - memory_after) / 1024 ** 2, 2),
+            }
+            print(f"Compacted {table_name} from {memory_before / 1024 ** 2:.1f} MB to "
+                  f"{memory_after / 1024 ** 2:.1f} MB "
+                  f"({1 - memory_after / memory_before if memory_before else 0:.0%} saved)")
+        return df
 
 
-    def clean_non_numerical_data(self, df, column_name):
-        '''
-        This function cleans the any column where its strictly a string
-        Parameters:
-        ----------  
-            df: DataFrame
-                the dataframe to be cleaned
-            column_name: string
-                the column name
+    
+    # helper functions
+    @staticmethod
+    def normalise_phone_numbers(phone_numbers, regex):
         '''
-        df[column_name] = df[column_name].astype(str)
-        df.loc[df[column_name].apply(self.check_sum_digit)] = np.nan
+        This function replaces the +44(0)/+49(0) prefixes with 0 and +1 with 1, then removes
+        brackets, dots and spaces.
 
-    def clean_weight(self, df):
-        '''
-        This function cleans the weight column 
         Parameters:
         ----------  
-            df: DataFrame
-                the dataframe to be cleaned
-        '''
-        df['weight'] = df['weight'].apply(self.convert_to_grams)
-        df['weight'] = df['weight'].apply(self.weight_validator)
+            phone_numbers: Series
+                the phone numbers
+            regex: string
+                the regular expression for values like +44(0), +49(0) and +1
 
-    def clean_month(self, df):
-        '''
-        This function cleans the month column 
-        Parameters:
-        ----------  
-            df: DataFrame
-                the dataframe to be cleaned
+        Returns:
+        --------
+            phone_numbers: Series
+                the normalised phone numbers
         '''
-        df['month'] = df['month'].apply(self.ismonth)
+        phone_numbers = phone_numbers.astype(str)
+        for prefixes, replacement in ((('+44', '+49'), '0'), (('+1',), '1')):
+            prefix_mask = phone_numbers.str.startswith(prefixes)
+            phone_numbers.loc[prefix_mask] = phone_numbers[prefix_mask].str.replace(regex, replacement, regex=True)
+        return phone_numbers.str.replace(r'[(). ]', '', regex=True)
 
-    def clean_year(self, df):
-        '''
-        This function cleans the year column 
-        Parameters:
-        ----------  
-            df: DataFrame
-                the dataframe to be cleaned
+    @staticmethod
+    def phone_number_e164(phone_numbers, country_codes):
         '''
-        df['year'] = df['year'].apply(self.isyear)
+        This function converts cleaned phone numbers to the E.164 format using the country code
+        of each row. Extensions (e.g. x123) and separators are dropped, and numbers that do not
+        have the right length for their country are set to NaN.
 
-    def clean_day(self, df):
-        '''
-        This function cleans the day column 
         Parameters:
         ----------  
-            df: DataFrame
-                the dataframe to be cleaned
-        '''
-        df['day'] = df['day'].apply(self.isdate)
+            phone_numbers: Series
+                the cleaned phone numbers
+            country_codes: Series
+                the country code (GB, DE or US) of each phone number
 
+        Returns:
+        --------
+            e164_numbers: Series
+                the phone numbers in E.164 format
+        '''
+        # country code: (calling code, national/international prefix, national number)
+        phone_number_formats = {
+            'GB': ('44', r'^(?:0044|0)', r'^\d{9,10}$'),
+            'DE': ('49', r'^(?:0049|0)', r'^\d{6,13}$'),
+            'US': ('1', r'^(?:001|1)', r'^\d{10}$'),
+        }
+        digits = phone_numbers.astype(str).str.replace(r'x\d*$', '', regex=True).str.replace(r'\D', '', regex=True)
+        e164_numbers = pd.Series(np.nan, index=phone_numbers.index, dtype=object)
+        for country_code, (calling_code, prefix, national_number) in phone_number_formats.items():
+            country_mask = country_codes == country_code
+            national = digits[country_mask].str.replace(prefix, '', regex=True)
+            valid = national.str.match(national_number)
+            e164_numbers.loc[national[valid].index] = '+' + calling_code + national[valid]
+        return e164_numbers
 
-    
-    # helper functions
-    @staticmethod
-    def check_sum_digit(string):
-        '''
-        This check if the number of digits exceeds one
-        '''
-        return sum(c.isdigit() for c in string) > 1
-    
-    @staticmethod
-    def remove_char_from_digit(df, column_name):
-        '''
-
-        Parameters:
-        ----------  
-            df: DataFrame
-                the dataframe to be cleaned
-            column_name: string
-                the column name
-        '''
-        df[column_name] = df[column_name].str.replace('[a-zA-Z]', '', regex=True)
-        df[column_name] = df[column_name].str.replace('    ', 'NULL') 
-        return df
-    
     @staticmethod
-    def phone_number_plus(regex, phone_number_string):
+    def parse_dates(values, formats):
         '''
-        This function cleans values such as +44(0), +49(0) and +1 and 
-        subsitute it with 0 or 1
+        This function parses a column of dates. Each distinct value is parsed only once: every
+        format is tried in a vectorised pass over the values not parsed yet, and whatever is
+        left is parsed one value at a time with pd.to_datetime. Invalid dates become NaT.
 
         Parameters:
         ----------  
-            regex: string
-                the format to match
-            phone_number_string: string
-                the phone number
+            values: Series
+                the column to be parsed
+            formats: list
+                the formats to try, in order (e.g. 'ISO8601', '%Y %B %d')
 
         Returns:
         --------
-            phone_number_string: string
-                cleaned phone_number_string 
-        '''
-        phone_number_string_match = re.search(regex, phone_number_string)
-
-        if phone_number_string_match and (phone_number_string[:3] == "+44" or phone_number_string[:3] == "+49"):
-            return re.sub(regex, "0",phone_number_string)
-
-        elif phone_number_string_match and phone_number_string[:2] == "+1":
-            return re.sub(regex, "1",phone_number_string)
-
-        return phone_number_string
-    
-    def clear_null(self, df, column_name):
-        '''
-        This function cleans any null values thats in a string format and replace it with
-        a NaN value.
-        
-        Parameters:
-        ----------  
-            df: DataFrame
-                the dataframe to be cleaned
-            column_name: string
-                the column name
-        '''
-        df[column_name].replace('NULL', np.nan, inplace=True)
-        df[column_name].replace('N/A', np.nan, inplace=True)
+            dates: Series
+                the parsed datetime column
+        '''
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values
+        codes, distinct_values = pd.factorize(values)
+        remaining = pd.Series(distinct_values, dtype=object)
+        parsed = pd.Series(pd.NaT, index=remaining.index, dtype='datetime64[ns]')
+        for date_format in formats:
+            if remaining.empty:
+                break
+            result = pd.to_datetime(remaining, format=date_format, errors='coerce')
+            found = result.notna()
+            parsed[found[found].index] = result[found]
+            remaining = remaining[~found]
+        if not remaining.empty:
+            parsed[remaining.index] = pd.to_datetime(
+                remaining.map(lambda value: pd.to_datetime(value, errors='coerce')), errors='coerce')
+        # missing values have code -1, which picks the NaT appended at the end
+        dates = np.append(parsed.to_numpy(), np.datetime64('NaT', 'ns'))[codes]
+        return pd.Series(dates, index=values.index, name=values.name)
 
-    def replace_string(self, df, column_name, string_from, string_to):
-        '''
-        This function replaces as string with another.
-        Parameters:
-        ----------  
-            df: DataFrame
-                the dataframe to be cleaned
-            column_name: string
-                the column name
-            string_from: string
-                the string to replace
-            string_to: string
-                the string to replace the string_from with 
-        '''
-        df[column_name] = df[column_name].astype(str).str.replace(string_from, string_to)
-        
     @staticmethod
     def check_credit_card_length(card_number):
         '''
@@ -527,75 +422,40 @@ class DataCleaning:
         return card_number
 
     @staticmethod
-    def convert_to_grams(metric_string):
+    def parse_weight(weights):
         '''
-        Converts the weight from their respective metrics to kg
+        Converts a column of weights such as "12 x 100g", "77g", "5oz", "1.5kg" or "77g ." to kg
+        in one vectorised pass. The quantity, the optional multiplier and the unit are extracted
+        with a single regex over the distinct weights and the unit is converted with a lookup array.
 
         Paramaters:
         -----------
-            metric_string: string
-                the weight from the dataframe
-
-        Returns:
-        --------
-            metric_string: string
-                formatted metric in kilograms
-
-        '''
-        metrics_conversion = {
-            'kg' : 1,
-            'g': 0.001,
-            'ml': 0.001,
-            'oz': 0.0283495
-        }
-        result = 0
-        metric = metric_string[-2:] if metric_string[-2:] in metrics_conversion else metric_string[-1:]
-
-        if metric in metrics_conversion and 'x' in metric_string:
-            x, y = metric_string.split('x')
-            x = float(x)
-            y = float(y.strip()[:-2] if y.strip()[:-2] in metrics_conversion else y.strip()[:-1])
-            result = x * y * metrics_conversion[metric]
-
-       
-        elif metric == ".":
-            remove_point_metric = metric_string.replace(".", "")
-            metric = remove_point_metric[-2:].strip()
-            value = remove_point_metric.replace(metric, "")
-            result = float(value) * metrics_conversion[metric]
-
-        else:
-            value = metric_string.replace(metric, "")
-            result = float(value) * metrics_conversion[metric]
+            weights: Series
+                the weight column
 
-        return str(result) + "kg"
-
-
-    @staticmethod
-    def weight_validator(weight_string):
-        '''
-        Checks if the weights in the weight column follows a similar format. if so we return the
-        string else we set it to NaN.
-
-        Parameters:
-        -----------
-            weight_string: string
-                the weight from the weight column
-        
         Returns:
         --------
-            weight_string or NaN
-        '''
-        weight_with_x_regex = r'\d+\s*x\s*\d+[g|kg|ml|oz]'
-        weight_without_x_regex = r'\d+[g|kg|ml|oz]'
+            weight_kg: Series
+                the weights in kilograms (float), NaN where the weight is invalid
+
+            valid_weight_mask: Series
+                True where the weight follows one of the known formats
+        '''
+        units = ['kg', 'g', 'ml', 'oz']
+        kg_per_unit = np.array([1, 0.001, 0.001, 0.0283495])
+        # weights repeat a lot, so only the distinct values are parsed
+        weight_codes, distinct_weights = pd.factorize(weights.astype(str))
+        parts = pd.Series(distinct_weights).str.extract(
+            r'^\s*(?:(?P<multiplier>\d+(?:\.\d+)?)\s*x\s*)?(?P<quantity>\d+(?:\.\d+)?)\s*(?P<unit>kg|g|ml|oz)\s*\.?\s*$')
+        unit_codes = pd.Categorical(parts['unit'], categories=units).codes
+        conversion = np.where(unit_codes >= 0, kg_per_unit[unit_codes], np.nan)
+        multiplier = parts['multiplier'].astype(float).fillna(1).to_numpy()
+        quantity = parts['quantity'].astype(float).to_numpy()
+        distinct_kg = multiplier * quantity * conversion
+        weight_kg = pd.Series(distinct_kg[weight_codes], index=weights.index)
+        valid_weight_mask = weight_kg.notna()
+        return weight_kg, valid_weight_mask
 
-        with_x = re.search(weight_with_x_regex, weight_string)
-        without_x = re.search(weight_without_x_regex, weight_string)
-
-        if with_x or without_x:
-            return weight_string
-        return np.nan
-    
     @staticmethod
     def isyear(year_string):
         '''
@@ -646,4 +506,4 @@ class DataCleaning:
 
 if __name__ == "__main__":
     cleaning_data = DataCleaning()
-    print(cleaning_data.convert_to_grams("77g"))
\ No newline at end of file
+    print(cleaning_data.parse_weight(pd.Series(["77g"]))[0][0])
\ No newline at end of file
@@ -1,9 +1,40 @@
-import pandas as pd
-import tabula
-import requests
-import boto3
-import yaml
-from botocore.exceptions import NoCredentialsError, ClientError
+import io
+import json
+import multiprocessing
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from settings import Settings
+
+# the source libraries (pandas, tabula, requests, boto3, sqlalchemy, ijson, pypdf) are imported
+# in the methods that use them, so importing this module and creating a DataExtractor is quick
+API_SETTINGS_KEYS = ('retrieve_store_total', 'retrieve_store_data', 'data_handling_s3', 'file_s3',
+                     'cards_details_data', 'dates_data')
+# the products csv columns read as strings (EANs keep their leading zeros and the garbage rows
+# don't turn the prices or weights into mixed columns); the unnamed index column is inferred
+PRODUCTS_DTYPES = dict.fromkeys(['product_name', 'product_price', 'weight', 'category', 'EAN', 'date_added',
+                                 'uuid', 'removed', 'product_code'], str)
+
+def read_pdf_pages(pdf, pages):
+    '''
+    Reads the tables of the given pages of a pdf. This runs in a worker process, so it has
+    to be a module level function.
+
+    Parameters:
+    -----------
+        pdf: str
+            the local path of the pdf
+
+        pages: list
+            the page numbers to read (starting at 1)
+
+    Return:
+    -------
+        multiple_df: list
+            one dataframe per table found, in page order
+    '''
+    import tabula
+    return tabula.read_pdf(pdf, pages=pages)
+
 
 class DataExtractor:
 
@@ -16,66 +47,88 @@ class DataExtractor:
 
     Attributes:
     ----------
-    header: dict
-        a private dictionary variable containing the API key
-
-    __store_number: string
-        a private string containing the url for getting the total number of stores
-    
-    __store_url: string
-        a private string containing the url for the store data
-
-    __s3_bucket_name: string
-        a private string containing the s3 bucket url
-
-    __s3_file : string
-        a private string containing the file name inside the s3 bucket
-
-    __card_data: string
-        a private string containing the url for getting the card_details data
-    
-    __dates_data: sting
-         a private string containing the url for getting the data events data
+    settings: Settings
+        the API key and the urls, bucket and file names of the sources, read from
+        creds/api_creds.yaml the first time one of them is needed:
+
+        retrieve_store_total: the url for getting the total number of stores
+        retrieve_store_data: the url for the store data
+        data_handling_s3: the s3 bucket name
+        file_s3: the file name inside the s3 bucket
+        cards_details_data: the url for getting the card_details data
+        dates_data: the url for getting the data events data
+
+    cache: ArtifactCache
+        optional local cache of the products csv, card details pdf and date events json.
+        If None, they are downloaded on every run
     
     Methods:
     -------
     read_rds_table(table_name, engine)
         gets the data from the aws RDS database based on the table name
+
+    stream_rds_table(table_name, engine, chunksize)
+        yields the data from the aws RDS database in chunks using a server-side cursor
+
+    get_rds_watermark(table_name, engine, column)
+        gets the highest value of the watermark column in the aws RDS table
+
+    read_rds_table_range(table_name, engine, column, lower, upper)
+        gets only the rows of the aws RDS table with lower < column <= upper
     
-    retrieve_pdf_data()
-        gets the data from the url pdf link. the pdf is in an AWS S3 bucket
+    retrieve_pdf_data(pages_per_batch, max_workers)
+        gets the data from the url pdf link. the pdf is in an AWS S3 bucket.
+        The pages can be read in batches by a process pool
     
     extract_from_s3()
-        Get data from s3 bucket 
+        Get data from s3 bucket, streamed straight into a dataframe
+
+    read_products(source, file_name)
+        reads the products file (csv, gzip/zstd csv or parquet) into a dataframe
 
     list_number_of_stores()
         gets the list of stores from the url
     
-    retrieve_stores_data(number_of_stores)
-        retrieve each store data and store the results as a dataframe
+    retrieve_stores_data(number_of_stores, max_workers, timeout, retries, backoff)
+        retrieve each store data concurrently and store the results as a dataframe
+
+    create_session(pool_size, retries, backoff)
+        creates a keep-alive requests session with retries and backoff
 
-    get_date_data()
+    fetch_store(session, store, timeout)
+        retrieve a single store's data using the given session
+
+    merge_pdf_pages(multiple_df)
+        concatenates the tables of each pdf page with consistent column names and dtypes
+
+    get_date_data(stream)
         retrieve the date data from the url (the data is in a json format) and store the results in
         a dataframe
+
+    iter_json_columns(file)
+        incrementally parses a json object of columns and yields one column at a time
+
+    build_date_frame(columns)
+        builds the date events dataframe in one pass from its columns
     '''
 
-    def __init__(self):
-        self.__header = self.read_yaml_file("creds/api_creds.yaml")
-        self.__store_number = self.read_yaml_file("creds/api_creds.yaml")['retrieve_store_total']
-        self.__store_url = self.read_yaml_file("creds/api_creds.yaml")['retrieve_store_data']
-        self.__s3_bucket_name = self.read_yaml_file("creds/api_creds.yaml")['data_handling_s3']
-        self.__s3_file = self.read_yaml_file("creds/api_creds.yaml")['file_s3']
-        self.__card_data = self.read_yaml_file("creds/api_creds.yaml")['cards_details_data']
-        self.__dates_data = self.read_yaml_file("creds/api_creds.yaml")['dates_data']
+    def __init__(self, cache=None, settings=None):
+        self.cache = cache
+        self.settings = settings or Settings("creds/api_creds.yaml", API_SETTINGS_KEYS)
+
+    @property
+    def __header(self):
+        '''
+        the headers sent to the store API, which hold the API key
+        '''
+        return dict(self.settings.values)
 
     def read_yaml_file(self, api_yaml):
         try:
-            with open(api_yaml, 'r') as file:
-                api_creds = yaml.safe_load(file)
-                return api_creds
-        except yaml.YAMLError as e:
-                    print(f"Error reading YAML file: {e}")
-                    return None
+            return dict(Settings.load(api_yaml))
+        except ValueError as e:
+            print(e)
+            return None
 
     def read_rds_table(self, table_name, engine):
          '''
@@ -97,19 +150,125 @@ class DataExtractor:
             df: DataFrame
                 the dataframe to be cleaned
          '''
+         import pandas as pd
          df = pd.read_sql_table(table_name, engine)
          return df
+
+    def get_rds_watermark(self, table_name, engine, column):
+        '''
+        This function gets the highest value of the watermark column (e.g. index) in the AWS RDS table
+
+        Parameters:
+        -----------
+        table_name: str
+            the name of the table
+
+        engine: sqlalchemy Engine
+            sqlalchemy database engine
+
+        column: str
+            the watermark column, which must only grow as rows are added
+
+        Return:
+        -------
+            watermark: int, str or None
+                the highest value of the column, None if the table is empty
+        '''
+        from sqlalchemy import MetaData, Table, func, select
+        table = Table(table_name, MetaData(), autoload_with=engine)
+        with engine.connect() as connection:
+            return connection.execute(select(func.max(table.c[column]))).scalar()
+
+    def read_rds_table_range(self, table_name, engine, column, lower, upper):
+        '''
+        This function gets the rows of the AWS RDS table whose watermark column is greater than
+        lower and at most upper, and store the results in a dataframe. The dataframe's index is
+        set to the watermark column so it lines up with a full read of the table.
+
+        Parameters:
+        -----------
+        table_name: str
+            the name of the table
+
+        engine: sqlalchemy Engine
+            sqlalchemy database engine
+
+        column: str
+            the watermark column
+
+        lower: int, str or None
+            the watermark of the last load (None reads from the start)
+
+        upper: int, str or None
+            the watermark to read up to (None reads to the end)
+
+        Return:
+        -------
+            df: DataFrame
+                the new rows to be cleaned
+        '''
+        import pandas as pd
+        from sqlalchemy import MetaData, Table, select
+        table = Table(table_name, MetaData(), autoload_with=engine)
+        query = select(table).order_by(table.c[column])
+        if lower is not None:
+            query = query.where(table.c[column] > lower)
+        if upper is not None:
+            query = query.where(table.c[column] <= upper)
+        with engine.connect() as connection:
+            df = pd.read_sql_query(query, connection)
+        df.index = pd.Index(df[column].to_numpy())
+        return df
+
+    def stream_rds_table(self, table_name, engine, chunksize=50000):
+        '''
+        This function gets the data from AWS RDS based on the table name and yields the results
+        as dataframes of at most chunksize rows. The rows are read through a server-side cursor,
+        so only one chunk is held in memory at a time.
+
+        The index of each chunk carries on from the previous one, so concatenating the chunks gives
+        the same dataframe as read_rds_table.
+
+        Parameters:
+        -----------
+        table_name: str
+            the name of the table
+
+        engine: sqlalchemy Engine
+            sqlalchemy database engine
+
+        chunksize: int
+            the number of rows in each chunk
+
+        Yields:
+        -------
+            df: DataFrame
+                a chunk of the dataframe to be cleaned
+        '''
+        import pandas as pd
+        offset = 0
+        with engine.connect().execution_options(stream_results=True, max_row_buffer=chunksize) as connection:
+            for df in pd.read_sql_table(table_name, connection, chunksize=chunksize):
+                df.index = pd.RangeIndex(offset, offset + len(df))
+                offset += len(df)
+                yield df
     
-    def retrieve_pdf_data(self):
+    def retrieve_pdf_data(self, pages_per_batch=None, max_workers=None):
         '''
         This function gets the data from the url thats in a pdf format 
         and store the results as a pandas dataframe
 
+        If pages_per_batch is set, the pdf is downloaded once, split into batches of pages
+        and the batches are read at the same time in a process pool. The tables are merged
+        back in page order with the column names of the first page.
 
         Paramters:
         ----------
-            url: str
-                the url
+            pages_per_batch: int
+                the number of pages read by each worker (None reads all the pages at once)
+
+            max_workers: int
+                the max number of worker processes (defaults to the number of cores)
 
         Return:
         -------
@@ -117,25 +276,90 @@ class DataExtractor:
                 the dataframe to be cleaned
         
         '''
-        multiple_df = tabula.read_pdf(self.__card_data, pages='all')
+        import pandas as pd
+        import tabula
+        pdf = self.settings['cards_details_data']
+        if self.cache:
+            pdf = self.cache.fetch_url(pdf)
+        if not pages_per_batch:
+            multiple_df = tabula.read_pdf(pdf, pages='all')
+            df = pd.concat(multiple_df)
+            return df
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            if not self.cache:
+                import requests
+                response = requests.get(pdf, timeout=60)
+                response.raise_for_status()
+                pdf = f"{temp_dir}/card_details.pdf"
+                with open(pdf, 'wb') as file:
+                    file.write(response.content)
+            from pypdf import PdfReader
+            number_of_pages = len(PdfReader(pdf).pages)
+            batches = [list(range(start, min(start + pages_per_batch, number_of_pages + 1)))
+                       for start in range(1, number_of_pages + 1, pages_per_batch)]
+            # spawn instead of fork, as this may run alongside other threads of the pipeline
+            with ProcessPoolExecutor(max_workers=max_workers,
+                                     mp_context=multiprocessing.get_context('spawn')) as executor:
+                multiple_df = [page_df for batch_df in executor.map(read_pdf_pages, [pdf] * len(batches), batches)
+                               for page_df in batch_df]
+        return self.merge_pdf_pages(multiple_df)
+
+    @staticmethod
+    def merge_pdf_pages(multiple_df):
+        '''
+        This function concatenates the tables read from each page of a pdf. Tables with the
+        same number of columns as the first one get its column names, and columns whose dtype
+        differs between pages are stored as objects.
+
+        Parameters:
+        -----------
+            multiple_df: list
+                the tables in page order
+
+        Return:
+        -------
+            df: DataFrame
+                the merged dataframe
+
+        Raises:
+        -------
+            ValueError: If no table was read from the pdf.
+        '''
+        import pandas as pd
+        if not multiple_df:
+            raise ValueError("No tables were found in the pdf.")
+        columns = multiple_df[0].columns
+        multiple_df = [page_df.set_axis(columns, axis=1) if len(page_df.columns) == len(columns) else page_df
+                       for page_df in multiple_df]
+        mixed_columns = [column for column in columns
+                         if len({str(page_df[column].dtype) for page_df in multiple_df if column in page_df}) > 1]
+        multiple_df = [page_df.astype({column: object for column in mixed_columns if column in page_df})
+                       for page_df in multiple_df]
         df = pd.concat(multiple_df)
         return df
-        
 
     def extract_from_s3(self):
         '''
-        This is a function that gets the data from aws s3 bucket,
-        download the data as a csv and store result as a pandas dataframe.
+        This is a function that gets the data from aws s3 bucket and store result as a pandas
+        dataframe. The object is streamed from get_object straight into read_csv, so nothing is
+        written to the working directory.
 
         Return:
         ------
             df: DataFrame
                 the dataframe to be cleaned
         '''
+        import boto3
+        from botocore.exceptions import NoCredentialsError, ClientError
+        bucket_name, file_name = self.settings['data_handling_s3'], self.settings['file_s3']
         try:
             s3 = boto3.client('s3')
-            s3.download_file(self.__s3_bucket_name, self.__s3_file, './products.csv')
-            df = pd.read_csv("./products.csv")
+            if self.cache:
+                return self.read_products(self.cache.fetch_s3(s3, bucket_name, file_name), file_name)
+            response = s3.get_object(Bucket=bucket_name, Key=file_name)
+            with response['Body'] as body:
+                df = self.read_products(body, file_name)
             return df
 
         except NoCredentialsError:
@@ -148,6 +372,34 @@ class DataExtractor:
                 print("An error occurred:", e)
 
 
+    @staticmethod
+    def read_products(source, file_name):
+        '''
+        This function reads the products file into a dataframe in one pass, with the dtypes of
+        PRODUCTS_DTYPES. Files ending in .gz or .zst are decompressed while they are read, and
+        .parquet files are read with pyarrow.
+
+        Parameters:
+        ----------
+            source: str or file-like object
+                the local path or the stream of the file
+
+            file_name: str
+                the name of the file in the bucket, used to tell its format
+
+        Return:
+        ------
+            df: DataFrame
+                the dataframe to be cleaned
+        '''
+        import pandas as pd
+        if file_name.endswith('.parquet'):
+            if not isinstance(source, str):
+                source = io.BytesIO(source.read())
+            return pd.read_parquet(source)
+        compression = {'.gz': 'gzip', '.zst': 'zstd'}.get(file_name[file_name.rfind('.'):])
+        return pd.read_csv(source, dtype=PRODUCTS_DTYPES, compression=compression)
+
     def list_number_of_stores(self):
         '''
         This function get the number of stores from the url
@@ -163,62 +415,206 @@ class DataExtractor:
                 number of stores
 
         '''
+        import requests
         try:
-            number_of_stores = requests.get(self.__store_number, headers=self.__header)
+            number_of_stores = requests.get(self.settings['retrieve_store_total'], headers=self.__header)
             return number_of_stores.json()['number_stores']
         except requests.RequestException as e:
             print(f"Error: {e}")
 
     
-    def retrieve_stores_data(self, number_of_stores):
+    def create_session(self, pool_size=10, retries=3, backoff=0.5):
+        '''
+        This function creates a requests session that keeps the connections to the store API
+        alive and retries failed requests with an exponential backoff.
+
+        Parameter:
+        ----------
+            pool_size: int
+                the number of connections kept open in the pool
+
+            retries: int
+                the number of times a failed request is retried
+
+            backoff: float
+                the backoff factor (in seconds) between retries
+
+        Return:
+        ------
+            session: requests.Session
+                the session with the api key set in its headers
+        '''
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        retry = Retry(total=retries,
+                      backoff_factor=backoff,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.headers.update(self.__header)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def fetch_store(self, session, store, timeout=10):
+        '''
+        This function gets the data of a single store from the url.
+
+        Parameter:
+        ----------
+            session: requests.Session
+                the session used to send the request
+
+            store: int
+                the store index
+
+            timeout: float
+                the number of seconds to wait for the server to respond
+
+        Return:
+        ------
+            store_data: dict
+                the store data
+        '''
+        response = session.get(f"{self.settings['retrieve_store_data']}{store}", timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def retrieve_stores_data(self, number_of_stores, max_workers=10, timeout=10, retries=3, backoff=0.5):
         '''
         This function gets all the store data from the url and returns a dataframe.
+        The stores are fetched concurrently over a shared keep-alive session, and the rows
+        are kept in store index order.
 
         Parameter:
         ----------
             number_of_stores: int
                 the max number of stores avaliable
 
+            max_workers: int
+                the max number of requests sent at the same time (1 fetches the stores one by one)
+
+            timeout: float
+                the number of seconds to wait for each request
+
+            retries: int
+                the number of times a failed request is retried
+
+            backoff: float
+                the backoff factor (in seconds) between retries
+
         Return:
         ------
             df: DataFrame
                 the dataframe to be cleaned
 
         '''
-        list_of_stores = []
-        for store in range(0,number_of_stores):
-            url = f'{self.__store_url}{store}'
-            new_response = requests.get(url, headers=self.__header)
-            list_of_stores.append(new_response.json())
+        import pandas as pd
+        max_workers = max(1, max_workers)
+        with self.create_session(max_workers, retries, backoff) as session:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list_of_stores = list(executor.map(lambda store: self.fetch_store(session, store, timeout),
+                                                   range(0, number_of_stores)))
         df = pd.DataFrame(list_of_stores)
         return df
     
-    def get_date_data(self):
+    def get_date_data(self, stream=False):
         '''
         This function gets the data relating to dates from url and returns a dataframe 
 
         Parameter:
         ----------
-            url: string
-                the url link containing the json data containing the dates
+            stream: bool
+                if True, the json is decoded incrementally while it is read, so the whole
+                document is never held in memory next to the dataframe
 
         Return:
         ------
             df: DataFrame
                 the dataframe to be cleaned
         '''
+        import requests
+        dates_data = self.settings['dates_data']
         try:
-            date_event_data = requests.get(self.__dates_data)
-            df = pd.DataFrame()
-            for key, values in date_event_data.json().items():
-                df_temp = pd.DataFrame.from_dict(values, orient='index', columns=[key])
-                df = df_temp.join(df)
-            df = df[df.columns[::-1]]
-            return df 
+            if stream:
+                if self.cache:
+                    with open(self.cache.fetch_url(dates_data), 'rb') as file:
+                        return self.build_date_frame(self.iter_json_columns(file))
+                with requests.get(dates_data, stream=True) as response:
+                    response.raise_for_status()
+                    response.raw.decode_content = True
+                    return self.build_date_frame(self.iter_json_columns(response.raw))
+            if self.cache:
+                with open(self.cache.fetch_url(dates_data), 'r') as file:
+                    date_event_data = json.load(file)
+            else:
+                date_event_data = requests.get(dates_data).json()
+            return self.build_date_frame((key, list(values.keys()), list(values.values()))
+                                         for key, values in date_event_data.items())
         except requests.RequestException as e:
             print(f"Error: {e}")
-        
 
+    @staticmethod
+    def iter_json_columns(file):
+        '''
+        This function incrementally parses a json object shaped like {column: {row: value}}
+        and yields each column as soon as it has been read. Numbers are parsed as floats rather
+        than Decimals, like json.load does.
+
+        Parameter:
+        ----------
+            file: file-like object
+                the binary json stream
+
+        Yields:
+        ------
+            column: tuple
+                the column name, its row labels and its values
+        '''
+        import ijson
+        key = None
+        for prefix, event, value in ijson.parse(file, use_float=True):
+            if prefix == '' and event == 'map_key':
+                key, row_labels, values = value, [], []
+            elif prefix == key and event == 'map_key':
+                row_labels.append(value)
+            elif prefix == key and event == 'end_map':
+                yield key, row_labels, values
+            elif key is not None and event in ('string', 'number', 'boolean', 'null'):
+                values.append(value)
+
+    @staticmethod
+    def build_date_frame(columns):
+        '''
+        This function builds the date events dataframe in one pass from its columns. The rows
+        are labelled like the first column, and any column whose rows are in a different order
+        is aligned to it. Every column is stored with the object dtype.
+
+        Parameter:
+        ----------
+            columns: iterable
+                (column name, row labels, values) for each column
+
+        Return:
+        ------
+            df: DataFrame
+                the dataframe to be cleaned
+        '''
+        import numpy as np
+        import pandas as pd
+        index = None
+        data = {}
+        for key, row_labels, values in columns:
+            if index is None:
+                index = pd.Index(row_labels)
+            if len(row_labels) == len(index) and index.equals(pd.Index(row_labels)):
+                data[key] = np.array(values, dtype=object)
+            else:
+                data[key] = pd.Series(values, index=row_labels, dtype=object).reindex(index).to_numpy()
+        df = pd.DataFrame(data, index=index, copy=False)
+        return df
 
 if __name__ == "__main__":
     data_extractor = DataExtractor()
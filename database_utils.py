@@ -1,6 +1,9 @@
-import yaml
-from sqlalchemy import create_engine, inspect
-import pandas as pd
+import io
+import threading
+import time
+from sqlalchemy import MetaData, create_engine, inspect
+
+from settings import Settings
 
 
 class DatabaseConnector:
@@ -14,19 +17,66 @@ class DatabaseConnector:
         reads the yaml file and stores the results in a dictonary
 
     init_db_engine(creds)
-        creates the engine to connect to the database
+        returns the cached engine to connect to the aws database
+
+    init_local_engine(yaml_file)
+        returns the cached engine to connect to the local database
+
+    get_engine(key, url)
+        returns the engine stored under key, creating a pooled engine if needed
+
+    dispose_engines()
+        closes every pooled connection and empties the engine cache
 
     list_db_tables(engine)
         list the tables in the aws database
 
 
-    upload_to_db(df, table_name,yaml_file)
+    upload_to_db(df, table_name, yaml_file, if_exists, method, chunksize, dtype, schema)
         uploads the cleaned dataframe to the database
+
+    copy_to_db(df, table_name, engine, if_exists, chunksize, dtype, schema)
+        bulk loads the dataframe into postgresql using COPY FROM STDIN
+
+    swap_to_db(df, schema, engine, chunksize)
+        loads the dataframe into a staging table, builds its keys and indexes and swaps it
+        with the live table
+
+    create_table(schema, connection, if_exists)
+        creates a table with the column types and primary key of its schema
+
+    add_foreign_keys(schemas, yaml_file)
+        adds the foreign keys of the schemas once all the tables are loaded
+
+    copy_rows(cursor, df, table_name, quote, chunksize)
+        streams the dataframe's rows into a table with COPY FROM STDIN
+
+    upsert_to_db(df, table_name, yaml_file, key_columns, chunksize, schema)
+        inserts new rows and updates existing ones, matched on the key columns
+
+    The connector can be used as a context manager, which disposes the engines on exit.
     
     '''
+    def __init__(self, pool_size=5, max_overflow=10, pool_recycle=1800):
+        self.__engines = {}
+        self.__lock = threading.Lock()
+        self.__pool_options = {
+            'pool_size': pool_size,
+            'max_overflow': max_overflow,
+            'pool_recycle': pool_recycle,
+            'pool_pre_ping': True,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.dispose_engines()
+
     def read_db_creds(self, yaml_file):
         '''
-        reads the yaml file containing the aws credentials for connecting to the aws database
+        reads the yaml file containing the aws credentials for connecting to the aws database.
+        The file is parsed once per process (see Settings.load).
 
         Parameters:
         -----------
@@ -36,24 +86,20 @@ class DatabaseConnector:
         Return:
         -------
         yaml_file: dict
-            dictonay containing the credentials to connect the aws database
-
-        Raises:
-        -------
-            YAMLError: If the file doesnt exists or could not be loaded.
+            dictonay containing the credentials to connect the aws database, None if the
+            file could not be parsed
         '''
         try:
-            with open(yaml_file, 'r') as file:
-                yaml_file = yaml.safe_load(file)
-                return yaml_file
-        except yaml.YAMLError as e:
-                    print(f"Error reading YAML file: {e}")
-                    return None
+            return dict(Settings.load(yaml_file))
+        except ValueError as e:
+            print(e)
+            return None
             
 
     def init_db_engine(self, creds):
         '''
-        creates and returns a SQLAlchemy engine for connecting to a PostgreSQL database.
+        returns the SQLAlchemy engine for connecting to the AWS PostgreSQL database.
+        The engine is created once and reused on later calls.
 
 
         Parameters:
@@ -72,8 +118,69 @@ class DatabaseConnector:
         '''
         if creds is None:
             raise ValueError("Credentials are not provided or could not be loaded.")
-        engine = create_engine(f"postgresql+psycopg2://{creds['RDS_USER']}:{creds['RDS_PASSWORD']}@{creds['RDS_HOST']}:{creds['RDS_PORT']}/{creds['RDS_DATABASE']}")
-        return engine
+        return self.get_engine('rds', f"postgresql+psycopg2://{creds['RDS_USER']}:{creds['RDS_PASSWORD']}@{creds['RDS_HOST']}:{creds['RDS_PORT']}/{creds['RDS_DATABASE']}")
+
+    def init_local_engine(self, yaml_file):
+        '''
+        returns the SQLAlchemy engine for connecting to the local database the cleaned data
+        is uploaded to. The engine is created once and reused on later calls.
+
+        Parameters:
+        -----------
+        yaml_file: str
+            yaml file's location
+
+        Return:
+        -------
+        engine: sqlalchemy.engine.Engine
+            An SQLAlchemy engine object for the local database.
+
+        Raises:
+        -------
+        ValueError: If the credentials are not provided or could not be loaded.
+        '''
+        creds = self.read_db_creds(yaml_file)
+        if creds is None:
+            raise ValueError("Credentials are not provided or could not be loaded.")
+        return self.get_engine('local', f"{creds['DATABASE_TYPE_LOCAL']}+{creds['DBAPI_LOCAL']}://{creds['USER_LOCAL']}:{creds['PASSWORD_LOCAL']}@{creds['HOST_LOCAL']}:{creds['PORT_LOCAL']}/{creds['DATABASE_LOCAL']}")
+
+    def get_engine(self, key, url):
+        '''
+        returns the engine cached under key. If there is none, or it points to a different url,
+        a new engine with a connection pool is created and cached. This is safe to call from
+        several threads.
+
+        Parameters:
+        -----------
+        key: str
+            the name of the engine (e.g. 'rds' or 'local')
+
+        url: str
+            the database url
+
+        Return:
+        -------
+        engine: sqlalchemy.engine.Engine
+            the pooled engine
+        '''
+        with self.__lock:
+            cached_url, engine = self.__engines.get(key, (None, None))
+            if engine is None or cached_url != url:
+                if engine is not None:
+                    engine.dispose()
+                options = self.__pool_options if url.startswith('postgresql') else {'pool_pre_ping': True}
+                engine = create_engine(url, **options)
+                self.__engines[key] = (url, engine)
+            return engine
+
+    def dispose_engines(self):
+        '''
+        closes all the pooled connections of every cached engine and empties the cache.
+        '''
+        with self.__lock:
+            for _, engine in self.__engines.values():
+                engine.dispose()
+            self.__engines.clear()
     
     def list_db_tables(self,engine):
         '''
@@ -93,9 +200,12 @@ class DatabaseConnector:
         return inspector.get_table_names()
          
     
-    def upload_to_db(self, df, table_name,yaml_file):
+    def upload_to_db(self, df, table_name, yaml_file, if_exists='replace', method='copy', chunksize=100000, dtype=None,
+                     schema=None):
         '''
-        upload the clean dataframe to postgresql
+        upload the clean dataframe to postgresql and print the number of rows loaded per second.
+        If a schema is given, the dataframe is cast to it and the table is created with its types
+        and primary key before the rows are loaded.
 
         Parameters:
         ----------
@@ -107,14 +217,323 @@ class DatabaseConnector:
 
         yaml_file: str
             yaml file's location 
+
+        if_exists: str
+            what to do if the table already exists ('replace' or 'append').
+            Use 'append' to upload a dataframe chunk by chunk
+
+        method: str
+            'copy' to bulk load with COPY FROM STDIN, 'swap' to load a staging table and swap it
+            with the live one (needs a schema), or 'to_sql' to insert the rows with df.to_sql.
+            'copy' and 'swap' fall back to 'to_sql' when the database is not postgresql
+
+        chunksize: int
+            the number of rows sent to the database at a time
+
+        dtype: dict
+            optional mapping of column name to SQLAlchemy type used to create the table
+
+        schema: TableSchema
+            optional schema from schema_registry; replaces dtype
+
+        Raises:
+        -------
+            ValueError: If the dataframe doesn't fit the schema, or method is 'swap' without a schema.
         '''
-        creds = self.read_db_creds(yaml_file) 
-        if creds is None:
-            raise ValueError("Credentials are not provided or could not be loaded.")
-        engine = create_engine(f"{creds['DATABASE_TYPE_LOCAL']}+{creds['DBAPI_LOCAL']}://{creds['USER_LOCAL']}:{creds['PASSWORD_LOCAL']}@{creds['HOST_LOCAL']}:{creds['PORT_LOCAL']}/{creds['DATABASE_LOCAL']}")
-        engine.connect()
-        df.to_sql(table_name, engine, if_exists='replace', index=False)
+        engine = self.init_local_engine(yaml_file)
+        if method == 'swap' and schema is None:
+            raise ValueError("A schema is needed to swap a table.")
+        if schema is not None:
+            df = schema.cast(df)
+        start_time = time.perf_counter()
+        if method == 'swap' and engine.dialect.name == 'postgresql':
+            self.swap_to_db(df, schema, engine, chunksize)
+        elif method in ('copy', 'swap') and engine.dialect.name == 'postgresql':
+            self.copy_to_db(df, table_name, engine, if_exists, chunksize, dtype, schema)
+        elif schema is not None:
+            with engine.begin() as connection:
+                self.create_table(schema, connection, if_exists)
+                df.to_sql(table_name, connection, if_exists='append', index=False, chunksize=chunksize)
+        else:
+            with engine.begin() as connection:
+                df.to_sql(table_name, connection, if_exists=if_exists, index=False, chunksize=chunksize, dtype=dtype)
+        elapsed = time.perf_counter() - start_time
+        print(f"Uploaded {len(df)} rows to {table_name} in {elapsed:.2f} seconds "
+              f"({len(df) / elapsed if elapsed else 0:.0f} rows/second)")
+
+    def copy_to_db(self, df, table_name, engine, if_exists='replace', chunksize=100000, dtype=None, schema=None):
+        '''
+        bulk loads the dataframe into postgresql by streaming it as CSV through COPY FROM STDIN.
+        The table is created first from the schema if given, otherwise from the dataframe's
+        columns (or dtype if given), then the rows are copied chunksize rows at a time. The table
+        is created and loaded in a single transaction, so if the copy fails the table is left as
+        it was instead of being dropped and left empty.
+
+        Parameters:
+        ----------
+        df: DataFrame
+            the cleaned dataframe
+
+        table_name: str
+            the name of the SQL table
+
+        engine: sqlalchemy.engine.Engine
+            The SQLAlchemy engine connected to the PostgreSQL database.
 
+        if_exists: str
+            what to do if the table already exists ('replace' or 'append')
+
+        chunksize: int
+            the number of rows sent to the database at a time
+
+        dtype: dict
+            optional mapping of column name to SQLAlchemy type used to create the table
+
+        schema: TableSchema
+            optional schema the table is created from
+        '''
+        quote = engine.dialect.identifier_preparer.quote
+        with engine.begin() as connection:
+            if schema is not None:
+                self.create_table(schema, connection, if_exists)
+            else:
+                df.head(0).to_sql(table_name, connection, if_exists=if_exists, index=False, dtype=dtype)
+            # the copy goes through the same DBAPI connection, so it's part of the same transaction
+            with connection.connection.cursor() as cursor:
+                self.copy_rows(cursor, df, table_name, quote, chunksize)
+
+    def swap_to_db(self, df, schema, engine, chunksize=100000):
+        '''
+        replaces a table without readers ever seeing it missing or half loaded. The rows are
+        copied into a staging table with no keys, then the primary key and an index on each
+        foreign key column are built in bulk and the table is analyzed, and finally the live
+        table is dropped and the staging table renamed in one transaction. The staging table is
+        logged, as making an unlogged table logged writes the whole table to the WAL again.
+        The foreign keys themselves are added by add_foreign_keys once every table is swapped.
+
+        Parameters:
+        ----------
+        df: DataFrame
+            the dataframe, already cast to the schema
+
+        schema: TableSchema
+            the schema of the table
+
+        engine: sqlalchemy.engine.Engine
+            The SQLAlchemy engine connected to the PostgreSQL database.
+
+        chunksize: int
+            the number of rows sent to the database at a time
+        '''
+        quote = engine.dialect.identifier_preparer.quote
+        staging_name = f"{schema.name}_staging"
+        staging = schema.to_table(MetaData(), name=staging_name, primary_key=False)
+        indexed_columns = [column for column in schema.foreign_keys if column not in schema.primary_key]
+        with engine.begin() as connection:
+            staging.drop(connection, checkfirst=True)
+            staging.create(connection)
+        connection = engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                self.copy_rows(cursor, df, staging_name, quote, chunksize)
+                if schema.primary_key:
+                    keys = ', '.join(quote(column) for column in schema.primary_key)
+                    cursor.execute(f"ALTER TABLE {quote(staging_name)} "
+                                   f"ADD CONSTRAINT {quote(f'{staging_name}_pkey')} PRIMARY KEY ({keys})")
+                for column in indexed_columns:
+                    cursor.execute(f"CREATE INDEX {quote(f'{staging_name}_{column}_idx')} "
+                                   f"ON {quote(staging_name)} ({quote(column)})")
+                cursor.execute(f"ANALYZE {quote(staging_name)}")
+            connection.commit()
+            # the swap is its own short transaction, so the live table is only locked while it's renamed
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {quote(schema.name)} CASCADE")
+                cursor.execute(f"ALTER TABLE {quote(staging_name)} RENAME TO {quote(schema.name)}")
+                if schema.primary_key:
+                    cursor.execute(f"ALTER TABLE {quote(schema.name)} RENAME CONSTRAINT "
+                                   f"{quote(f'{staging_name}_pkey')} TO {quote(f'{schema.name}_pkey')}")
+                for column in indexed_columns:
+                    cursor.execute(f"ALTER INDEX {quote(f'{staging_name}_{column}_idx')} "
+                                   f"RENAME TO {quote(f'{schema.name}_{column}_idx')}")
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def create_table(self, schema, connection, if_exists='replace'):
+        '''
+        creates the table of the schema with its column types and primary key. With 'replace',
+        an existing table is dropped first, together with the foreign keys pointing to it.
+        It runs in the connection's transaction, so it's only committed with the rows loaded after it.
+
+        Parameters:
+        ----------
+        schema: TableSchema
+            the schema of the table
+
+        connection: sqlalchemy.engine.Connection
+            The SQLAlchemy connection to the database, in a transaction.
+
+        if_exists: str
+            what to do if the table already exists ('replace' or 'append')
+        '''
+        table = schema.to_table(MetaData())
+        if if_exists == 'replace':
+            if connection.dialect.name == 'postgresql':
+                quote = connection.dialect.identifier_preparer.quote
+                connection.exec_driver_sql(f"DROP TABLE IF EXISTS {quote(schema.name)} CASCADE")
+            else:
+                table.drop(connection, checkfirst=True)
+        table.create(connection, checkfirst=True)
+
+    def add_foreign_keys(self, schemas, yaml_file):
+        '''
+        adds the foreign keys of the schemas. This runs once every table is loaded, so the
+        tables can be loaded at the same time. A foreign key that already exists is replaced.
+
+        Parameters:
+        ----------
+        schemas: list
+            the TableSchemas of the loaded tables
+
+        yaml_file: str
+            yaml file's location
+
+        Raises:
+        -------
+            ValueError: If the database is not postgresql.
+        '''
+        engine = self.init_local_engine(yaml_file)
+        if engine.dialect.name != 'postgresql':
+            raise ValueError("Foreign keys can only be added to postgresql databases.")
+        quote = engine.dialect.identifier_preparer.quote
+        with engine.begin() as connection:
+            for schema in schemas:
+                for column_name, (referred_table, referred_column) in schema.foreign_keys.items():
+                    constraint = quote(f"{column_name}_fk")
+                    connection.exec_driver_sql(f"ALTER TABLE {quote(schema.name)} DROP CONSTRAINT IF EXISTS {constraint}")
+                    connection.exec_driver_sql(
+                        f"ALTER TABLE {quote(schema.name)} ADD CONSTRAINT {constraint} FOREIGN KEY "
+                        f"({quote(column_name)}) REFERENCES {quote(referred_table)} ({quote(referred_column)})")
+
+    def copy_rows(self, cursor, df, table_name, quote, chunksize=100000):
+        '''
+        streams the rows of the dataframe as CSV into an existing table with COPY FROM STDIN,
+        chunksize rows at a time.
+
+        Parameters:
+        ----------
+        cursor: psycopg2 cursor
+            the cursor of the connection the rows are copied through
+
+        df: DataFrame
+            the cleaned dataframe
+
+        table_name: str
+            the name of the SQL table
+
+        quote: function
+            quotes a table or column name for postgresql
+
+        chunksize: int
+            the number of rows sent to the database at a time
+        '''
+        columns = ', '.join(quote(str(column)) for column in df.columns)
+        copy_sql = f"COPY {quote(table_name)} ({columns}) FROM STDIN WITH (FORMAT csv)"
+        for start in range(0, len(df), chunksize):
+            buffer = io.StringIO()
+            df.iloc[start:start + chunksize].to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+
+    def upsert_to_db(self, df, table_name, yaml_file, key_columns=None, chunksize=100000, schema=None):
+        '''
+        upserts the clean dataframe into postgresql: rows whose key is new are inserted and
+        rows whose key already exists are updated. The rows are copied into a temporary table
+        and merged with INSERT ... ON CONFLICT in one transaction. If the table doesn't exist
+        yet, it is created from the schema if given, otherwise from the dataframe's columns.
+        Rows of the dataframe with the same key are upserted once, keeping the last of them.
+
+        Parameters:
+        ----------
+        df: DataFrame
+            the cleaned dataframe
+
+        table_name: str
+            the name of the SQL table
+
+        yaml_file: str
+            yaml file's location
+
+        key_columns: list
+            the columns that identify a row (e.g. ['date_uuid']), the unique key of the
+            schema if not given
+
+        chunksize: int
+            the number of rows sent to the database at a time
+
+        schema: TableSchema
+            optional schema from schema_registry the dataframe is cast to
+
+        Raises:
+        -------
+        ValueError: If the local database is not postgresql, there are no key columns, the
+            dataframe doesn't fit the schema or the table already has rows with the same key.
+        '''
+        if key_columns is None and schema is not None:
+            key_columns = schema.unique_key
+        if not key_columns:
+            raise ValueError(f"Upserting {table_name} needs the columns that identify a row.")
+        engine = self.init_local_engine(yaml_file)
+        if engine.dialect.name != 'postgresql':
+            raise ValueError("Upserts are only supported for postgresql databases.")
+        # ON CONFLICT can't update the same row twice in one statement
+        df = df.drop_duplicates(key_columns, keep='last')
+        if schema is not None:
+            df = schema.cast(df)
+            with engine.begin() as connection:
+                self.create_table(schema, connection, if_exists='append')
+        elif not inspect(engine).has_table(table_name):
+            with engine.begin() as connection:
+                df.head(0).to_sql(table_name, connection, index=False)
+        quote = engine.dialect.identifier_preparer.quote
+        keys = ', '.join(quote(column) for column in key_columns)
+        columns = ', '.join(quote(str(column)) for column in df.columns)
+        updates = ', '.join(f"{quote(str(column))} = EXCLUDED.{quote(str(column))}"
+                            for column in df.columns if column not in key_columns)
+        on_conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        index_name = quote(f'{table_name}_upsert_key')
+        start_time = time.perf_counter()
+        connection = engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT to_regclass(%s)", (index_name,))
+                if cursor.fetchone()[0] is None:
+                    # the unique index can't be created over rows loaded before with the same key
+                    cursor.execute(f"SELECT {keys} FROM {quote(table_name)} GROUP BY {keys} "
+                                   f"HAVING COUNT(*) > 1 LIMIT 3")
+                    duplicates = cursor.fetchall()
+                    if duplicates:
+                        raise ValueError(f"{table_name} already has rows with the same {', '.join(key_columns)} "
+                                         f"(e.g. {duplicates}), reload it in full before upserting into it.")
+                    cursor.execute(f"CREATE UNIQUE INDEX {index_name} ON {quote(table_name)} ({keys})")
+                cursor.execute(f"CREATE TEMP TABLE {quote(f'{table_name}_stage')} "
+                               f"(LIKE {quote(table_name)} INCLUDING DEFAULTS) ON COMMIT DROP")
+                self.copy_rows(cursor, df, f'{table_name}_stage', quote, chunksize)
+                cursor.execute(f"INSERT INTO {quote(table_name)} ({columns}) "
+                               f"SELECT {columns} FROM {quote(f'{table_name}_stage')} "
+                               f"ON CONFLICT ({keys}) {on_conflict}")
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+        elapsed = time.perf_counter() - start_time
+        print(f"Upserted {len(df)} rows into {table_name} in {elapsed:.2f} seconds "
+              f"({len(df) / elapsed if elapsed else 0:.0f} rows/second)")
 
 if __name__ == '__main__':
      pass
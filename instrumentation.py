@@ -0,0 +1,331 @@
+import cProfile
+import functools
+import json
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+
+class Instrumentation:
+    '''
+    Instrumentation class records how long each pipeline stage takes, how many rows go in and
+    out of it, its throughput and the most memory it allocated. The results can be written as a
+    json run report and as Prometheus metrics, and a single stage can be profiled with cProfile
+    (or pyinstrument if it's installed).
+
+    The memory of a stage is measured with tracemalloc if trace_memory is set. Tracing makes
+    allocation-heavy code several times slower (e.g. cleaning the users), so it's only
+    started when a report or metrics are asked for. It's the peak of the memory allocated
+    by Python and numpy while the stage ran, above what was allocated when it started. Stages
+    running at the same time share the process, so each one's peak also counts what the others
+    allocated meanwhile; memory of the cleaning worker processes isn't counted. The run report
+    also has the peak resident memory of the whole process.
+
+    Attributes:
+    ----------
+    stages: list
+        one record per stage call, in the order they finished
+
+    profile_stage: str
+        the name of the stage to profile (e.g. 'DataCleaning.clean_user_data'), or None
+
+    trace_memory: bool
+        if True, the peak memory of each stage is traced with tracemalloc
+
+    Methods:
+    -------
+    instrument(obj, method_names)
+        wraps the methods of an object so every call is recorded
+
+    wrap(func, stage)
+        wraps a function so every call is recorded as the given stage
+
+    start_stage(call_id)
+        starts measuring the memory allocated by a stage call
+
+    finish_stage(call_id)
+        returns the peak memory allocated by a stage call
+
+    report()
+        returns the run report as a dictionary
+
+    write_report(path)
+        writes the run report as json
+
+    prometheus_metrics()
+        returns the stage metrics in the Prometheus text format
+
+    write_prometheus(path)
+        writes the Prometheus metrics to a file (e.g. for the node exporter textfile collector)
+    '''
+    def __init__(self, profile_stage=None, profile_path=None, trace_memory=True):
+        self.stages = []
+        self.profile_stage = profile_stage
+        self.profile_path = profile_path
+        self.trace_memory = trace_memory
+        self.started_at = time.time()
+        self.__lock = threading.Lock()
+        # the [start, peak] traced memory of each running stage
+        self.__running_stages = {}
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @staticmethod
+    def count_rows(value):
+        '''
+        returns the number of rows of a dataframe, or None for anything else
+        '''
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return len(value)
+        return None
+
+    @staticmethod
+    def peak_memory_mb():
+        '''
+        returns the peak resident memory of the process so far, in MB. This is the high-water
+        mark of the whole run, not of a single stage (see start_stage).
+        '''
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+        return round(peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024, 1)
+
+    def update_stage_peaks(self):
+        '''
+        folds the traced peak since the last reset into the peak of every running stage.
+        Called with the lock held.
+        '''
+        peak = tracemalloc.get_traced_memory()[1]
+        for memory in self.__running_stages.values():
+            memory[1] = max(memory[1], peak)
+
+    def start_stage(self, call_id):
+        '''
+        starts measuring the memory of a stage call. The tracemalloc peak is reset so the stage
+        doesn't inherit the peak of earlier stages; the peak so far is kept for the stages
+        already running.
+
+        Parameters:
+        -----------
+        call_id: object
+            identifies the stage call until finish_stage
+        '''
+        if not self.trace_memory:
+            return
+        with self.__lock:
+            self.update_stage_peaks()
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            self.__running_stages[call_id] = [current, current]
+
+    def finish_stage(self, call_id):
+        '''
+        stops measuring the memory of a stage call
+
+        Parameters:
+        -----------
+        call_id: object
+            the id given to start_stage
+
+        Returns:
+        --------
+        peak_memory_mb: float or None
+            the peak memory allocated while the stage ran above what was allocated when it
+            started, in MB (None if memory isn't traced)
+        '''
+        if not self.trace_memory:
+            return None
+        with self.__lock:
+            self.update_stage_peaks()
+            start, peak = self.__running_stages.pop(call_id)
+        return round((peak - start) / 1024 ** 2, 1)
+
+    def instrument(self, obj, method_names):
+        '''
+        replaces the given methods of the object with recorded versions. The stage is named
+        after the class and the method, e.g. 'DataExtractor.retrieve_pdf_data'.
+
+        Parameters:
+        -----------
+        obj: object
+            the DataExtractor, DataCleaning or DatabaseConnector instance
+
+        method_names: list
+            the names of the methods to record
+
+        Returns:
+        --------
+        obj: object
+            the same object
+        '''
+        for method_name in method_names:
+            stage = f"{type(obj).__name__}.{method_name}"
+            setattr(obj, method_name, self.wrap(getattr(obj, method_name), stage))
+        return obj
+
+    def wrap(self, func, stage):
+        '''
+        wraps a function so each call records its wall time, rows in (the first dataframe
+        argument), rows out (the returned dataframe) and the peak memory it allocated.
+
+        Parameters:
+        -----------
+        func: function
+            the function to record
+
+        stage: str
+            the name of the stage
+
+        Returns:
+        --------
+        recorded_func: function
+            the wrapped function
+        '''
+        @functools.wraps(func)
+        def recorded_func(*args, **kwargs):
+            rows_in = next((self.count_rows(arg) for arg in args if self.count_rows(arg) is not None), None)
+            call_id = object()
+            self.start_stage(call_id)
+            start_time = time.perf_counter()
+            error = None
+            try:
+                if stage == self.profile_stage:
+                    result = self.profile(func, stage, *args, **kwargs)
+                else:
+                    result = func(*args, **kwargs)
+                return result
+            except Exception as e:
+                error = repr(e)
+                result = None
+                raise
+            finally:
+                seconds = time.perf_counter() - start_time
+                peak_memory_mb = self.finish_stage(call_id)
+                rows_out = self.count_rows(result)
+                rows = rows_out if rows_out is not None else rows_in
+                with self.__lock:
+                    self.stages.append({
+                        'stage': stage,
+                        'seconds': round(seconds, 4),
+                        'rows_in': rows_in,
+                        'rows_out': rows_out,
+                        'rows_per_second': round(rows / seconds) if rows is not None and seconds else None,
+                        'peak_memory_mb': peak_memory_mb,
+                        'error': error,
+                    })
+        return recorded_func
+
+    def profile(self, func, stage, *args, **kwargs):
+        '''
+        runs the function under pyinstrument if it's installed, otherwise under cProfile, and
+        saves the profile next to the run report.
+
+        Parameters:
+        -----------
+        func: function
+            the function to profile
+
+        stage: str
+            the name of the stage
+
+        Returns:
+        --------
+        result:
+            the return value of the function
+        '''
+        path = self.profile_path or stage
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(func, *args, **kwargs)
+            finally:
+                profiler.dump_stats(f"{path}.prof")
+                print(f"Saved the cProfile stats of {stage} to {path}.prof")
+        profiler = Profiler()
+        profiler.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.stop()
+            with open(f"{path}.html", 'w') as file:
+                file.write(profiler.output_html())
+            print(f"Saved the pyinstrument profile of {stage} to {path}.html")
+
+    def report(self):
+        '''
+        returns the run report: the total wall time, the peak memory and every stage record
+
+        Returns:
+        --------
+        report: dict
+            the run report
+        '''
+        with self.__lock:
+            stages = list(self.stages)
+        return {
+            'started_at': self.started_at,
+            'seconds': round(time.time() - self.started_at, 4),
+            'peak_memory_mb': self.peak_memory_mb(),
+            'stages': stages,
+        }
+
+    def write_report(self, path):
+        '''
+        writes the run report as json
+
+        Parameters:
+        -----------
+        path: str
+            location of the json file
+        '''
+        with open(path, 'w') as file:
+            json.dump(self.report(), file, indent=4)
+
+    def prometheus_metrics(self):
+        '''
+        returns the stage metrics in the Prometheus text exposition format. Stages called
+        several times (e.g. per chunk) are summed.
+
+        Returns:
+        --------
+        metrics: str
+            the metrics
+        '''
+        totals = {}
+        for record in self.report()['stages']:
+            total = totals.setdefault(record['stage'], {'seconds': 0, 'rows': 0, 'calls': 0, 'errors': 0})
+            total['seconds'] += record['seconds']
+            total['rows'] += record['rows_out'] if record['rows_out'] is not None else (record['rows_in'] or 0)
+            total['calls'] += 1
+            total['errors'] += record['error'] is not None
+        lines = []
+        for metric, help_text, key in (
+                ('etl_stage_seconds_total', 'Wall time spent in the stage.', 'seconds'),
+                ('etl_stage_rows_total', 'Rows produced by the stage.', 'rows'),
+                ('etl_stage_calls_total', 'Number of calls of the stage.', 'calls'),
+                ('etl_stage_errors_total', 'Number of failed calls of the stage.', 'errors')):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for stage, total in totals.items():
+                lines.append(f'{metric}{{stage="{stage}"}} {total[key]}')
+        lines.append("# HELP etl_peak_memory_megabytes Peak resident memory of the run.")
+        lines.append("# TYPE etl_peak_memory_megabytes gauge")
+        lines.append(f"etl_peak_memory_megabytes {self.peak_memory_mb()}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        '''
+        writes the Prometheus metrics to a file
+
+        Parameters:
+        -----------
+        path: str
+            location of the metrics file
+        '''
+        with open(path, 'w') as file:
+            file.write(self.prometheus_metrics())
@@ -1,73 +1,466 @@
 from data_cleaning import DataCleaning
 from data_extraction import DataExtractor
 from database_utils import DatabaseConnector
+from pipeline import Pipeline, PipelineError
+from watermark_store import WatermarkStore
+from artifact_cache import ArtifactCache
+from checkpoint_store import CheckpointStore
+from instrumentation import Instrumentation
+from schema_registry import SCHEMAS
+from sales_rollup import SalesRollup
+from functools import partial
+import argparse
 import time
 
 
-def main():
-    data_cleaning = DataCleaning()
-    data_extraction = DataExtractor()
-    database_connector = DatabaseConnector()
+TABLE_NAMES = ('dim_users', 'dim_card_details', 'dim_store_details', 'dim_products', 'orders_table', 'dim_date_times')
+TABLE_ALIASES = {
+    'users': 'dim_users',
+    'cards': 'dim_card_details',
+    'card_details': 'dim_card_details',
+    'stores': 'dim_store_details',
+    'store_details': 'dim_store_details',
+    'products': 'dim_products',
+    'orders': 'orders_table',
+    'dates': 'dim_date_times',
+    'date_times': 'dim_date_times',
+}
+STAGES = ('extract', 'clean', 'upload')
 
-    # sets up the engine
-    read_yaml_file = database_connector.read_db_creds('creds/db_creds.yaml')
-    engine = database_connector.init_db_engine(read_yaml_file)
-    engine.connect()
-    
-    table_names = database_connector.list_db_tables(engine)
 
+def stream_clean_upload(data_extraction, database_connector, engine, source_table, clean, target_table, chunk_size):
+    '''
+    Reads a table from AWS RDS chunk by chunk, cleans each chunk and appends it to the
+    target table, so only one chunk is held in memory at a time.
 
-    # clean user data
-    user_data_df = data_extraction.read_rds_table(table_names[2], engine)
-    user_data_df = data_cleaning.clean_user_data(user_data_df)
+    Parameters:
+    -----------
+        data_extraction: DataExtractor
+            the extractor used to read the source table
 
+        database_connector: DatabaseConnector
+            the connector used to upload the cleaned chunks (None only counts them)
 
-    # clean card details data
-    card_detail_data_df = data_extraction.retrieve_pdf_data()
-    card_detail_data_df = data_cleaning.clean_card_data(card_detail_data_df)
+        engine: sqlalchemy.engine.Engine
+            the engine connected to AWS RDS
 
+        source_table: str
+            the name of the table in AWS RDS
 
-    # get store data and clean it
-    number_of_stores = data_extraction.list_number_of_stores()
-    stores_df = data_extraction.retrieve_stores_data(number_of_stores)
-    stores_df = data_cleaning.called_clean_store_data(stores_df)
-    # nulls = stores_df[stores_df.isnull().any(axis=1)]
+        clean: function
+            the DataCleaning method that cleans a chunk (None only counts the raw rows)
 
-    # get products data and clean it
-    product_data_df = data_extraction.extract_from_s3()
-    product_data_df = data_cleaning.clean_products_data(product_data_df)
-    product_nulls = product_data_df[product_data_df.isnull().any(axis=1)]
+        target_table: str
+            the name of the table in the local database
 
-    # get order data and clean it
-    order_data_df = data_extraction.read_rds_table(table_names[3], engine)
-    order_data_df = data_cleaning.clean_orders_data(order_data_df)
-    # order_nulls = order_data_df[order_data_df.isnull().any(axis=1)]
+        chunk_size: int
+            the number of rows read at a time
 
-    # get date event and clean it 
-    date_event_df = data_extraction.get_date_data()
-    date_event_df = data_cleaning.clean_event_date(date_event_df)
-    # date_nulls = date_event_df[date_event_df.isnull().any(axis=1)]
+    Returns:
+    --------
+        total_rows: int
+            the number of rows read, cleaned or uploaded
+    '''
+    total_rows = 0
+    if_exists = 'replace'
+    for chunk in data_extraction.stream_rds_table(source_table, engine, chunk_size):
+        if clean is not None:
+            chunk = clean(chunk)
+        if database_connector is not None:
+            database_connector.upload_to_db(chunk, target_table, 'creds/db_creds.yaml', if_exists=if_exists,
+                                            schema=SCHEMAS[target_table])
+            if_exists = 'append'
+        total_rows += len(chunk)
+    return total_rows
 
 
-    # upload the resulting cleaned dataframe to postgres
-    database_connector.upload_to_db(user_data_df, 'dim_users', 'creds/db_creds.yaml')
-    database_connector.upload_to_db(card_detail_data_df, 'dim_card_details', 'creds/db_creds.yaml')#
-    database_connector.upload_to_db(stores_df, 'dim_store_details', 'creds/db_creds.yaml')
-    database_connector.upload_to_db(product_data_df, 'dim_products', 'creds/db_creds.yaml')
-    database_connector.upload_to_db(order_data_df, 'orders_table', 'creds/db_creds.yaml')
-    database_connector.upload_to_db(date_event_df, 'dim_date_times', 'creds/db_creds.yaml')
+def add_table_tasks(pipeline, table_name, extract, clean, upload, depends_on=(), checkpoints=None, compact=None,
+                    last_stage='upload'):
+    '''
+    Adds the extract -> clean -> upload tasks of a table to the pipeline, up to last_stage.
 
+    Parameters:
+    -----------
+        pipeline: Pipeline
+            the pipeline the tasks are added to
 
-    return user_data_df, card_detail_data_df, stores_df, product_data_df, order_data_df, date_event_df
+        table_name: str
+            the name of the table in the local database, used to name the tasks
+
+        extract: function
+            returns the raw dataframe, called with the results of depends_on
+
+        clean: function
+            the DataCleaning method that cleans the raw dataframe
+
+        upload: function
+            uploads the cleaned dataframe, called with the dataframe and table_name
+
+        depends_on: list
+            the tasks the extract task depends on
+
+        checkpoints: CheckpointStore
+            if given, the raw and cleaned dataframes are checkpointed (and reused when resuming)
+
+        compact: function
+            if given, shrinks the dtypes of the cleaned dataframe, called with the dataframe and table_name
+
+        last_stage: str
+            the last task added: 'extract', 'clean' or 'upload'
+    '''
+    if compact is not None:
+        clean = lambda df, clean=clean: compact(clean(df), table_name)
+    if checkpoints is not None:
+        extract = checkpoints.wrap(table_name, 'raw', extract)
+        clean = checkpoints.wrap(table_name, 'cleaned', clean)
+    pipeline.add_task(f'{table_name}:extract', extract, depends_on)
+    if last_stage != 'extract':
+        pipeline.add_task(f'{table_name}:clean', clean, [f'{table_name}:extract'])
+    if last_stage == 'upload':
+        pipeline.add_task(f'{table_name}:upload', lambda df: upload(df, table_name), [f'{table_name}:clean'])
+
+
+def resolve_tables(names):
+    '''
+    Returns the table names of the given tables, which can also be given by their aliases
+    (e.g. 'orders' for 'orders_table'), in the order of TABLE_NAMES.
+
+    Parameters:
+    -----------
+        names: list
+            the table names or aliases
+
+    Returns:
+    --------
+        table_names: list
+            the table names
+
+    Raises:
+    -------
+        ValueError: If a table is unknown.
+    '''
+    table_names = set()
+    for name in names:
+        table_name = TABLE_ALIASES.get(name, name)
+        if table_name not in TABLE_NAMES:
+            raise ValueError(f"Unknown table {name!r}, choose from {', '.join(TABLE_NAMES)} "
+                             f"or {', '.join(TABLE_ALIASES)}")
+        table_names.add(table_name)
+    return [table_name for table_name in TABLE_NAMES if table_name in table_names]
+
+
+def count_rows(result):
+    '''
+    Returns the number of rows of a task result: the length of a dataframe, the count
+    returned by a streamed table, or None for anything else.
+    '''
+    if isinstance(result, bool):
+        return None
+    if isinstance(result, int):
+        return result
+    return len(result) if hasattr(result, 'columns') else None
+
+
+def summarise_tables(results, durations, table_names, last_stage='upload'):
+    '''
+    Returns a line per table with the rows and seconds of each of its stages, instead of
+    printing the dataframes themselves.
+
+    Parameters:
+    -----------
+        results: dict
+            the results of the pipeline tasks
+
+        durations: dict
+            the seconds each pipeline task took
+
+        table_names: list
+            the tables of the run
+
+        last_stage: str
+            the last stage of the run
+
+    Returns:
+    --------
+        lines: list
+            the lines of the summary
+    '''
+    stages = STAGES[:STAGES.index(last_stage) + 1]
+    lines = [f"{'table':<20}" + ''.join(f"{stage:>26}" for stage in stages)]
+    for table_name in table_names:
+        cells = []
+        for stage in stages:
+            task = f'{table_name}:{stage}'
+            if task in results:
+                rows = count_rows(results[task])
+                cell = f"{'?' if rows is None else f'{rows:,}'} rows {durations.get(task, 0):.1f}s"
+            elif task in durations:
+                cell = f"failed {durations[task]:.1f}s"
+            else:
+                cell = '-'
+            cells.append(f"{cell:>26}")
+        lines.append(f"{table_name:<20}" + ''.join(cells))
+    return lines
+
+
+def main(chunk_size=None, max_workers=6, full_refresh=False, refresh_cache=False, run_dir=None, resume=False,
+         instrumentation=None, cleaning_workers=None, tables=None, last_stage='upload', cache_dir='.cache/artifacts'):
+    '''
+    Extracts, cleans and uploads the tables. Each table is a chain of
+    extract -> clean -> upload tasks, and the tables run at the same time.
+    A summary of the rows and time of each task is printed at the end.
+
+    Parameters:
+    -----------
+        chunk_size: int
+            if set, the user and orders tables are streamed from AWS RDS, cleaned and
+            uploaded chunk_size rows at a time, and their number of rows is returned in
+            place of the dataframes
+
+        max_workers: int
+            the max number of tasks running at the same time
+
+        full_refresh: bool
+            if True, the orders table is fully reloaded instead of only loading the
+            orders added since the last run
+
+        refresh_cache: bool
+            if True, the products csv, card details pdf and date events json are downloaded
+            again even if the cached copies are still up to date
+
+        run_dir: str
+            if set, the raw and cleaned dataframes of each table, and the quarantined rows,
+            are saved in this directory
+
+        resume: bool
+            if True, the stages already saved in run_dir are loaded instead of being run again
+
+        instrumentation: Instrumentation
+            if given, records the time, rows and memory of every extraction, cleaning and
+            upload call
+
+        cleaning_workers: int
+            if set, the columns of large tables are cleaned in row partitions by this many
+            processes at the same time
+
+        tables: list
+            the tables to run, by name or alias (all of them if None)
+
+        last_stage: str
+            'extract' or 'clean' stop each table after that stage, so nothing is written to
+            the local database and the orders watermark isn't moved
+
+        cache_dir: str
+            the directory the downloaded source files are cached in (nothing is cached if None)
+
+    Returns:
+    --------
+        results: dict
+            the result of the last stage of each table, keyed by table name
+
+    Raises:
+    -------
+        ValueError: If a table or the last stage is unknown.
+
+        PipelineError: If a table failed, after all the other tables have been uploaded.
+    '''
+    if last_stage not in STAGES:
+        raise ValueError(f"Unknown stage {last_stage!r}, choose from {', '.join(STAGES)}")
+    tables = resolve_tables(tables) if tables else list(TABLE_NAMES)
+    uploading = last_stage == 'upload'
+    data_cleaning = DataCleaning(workers=cleaning_workers)
+    data_extraction = DataExtractor(ArtifactCache(cache_dir, bypass=refresh_cache) if cache_dir else None)
+    watermarks = WatermarkStore()
+    checkpoints = CheckpointStore(run_dir, resume) if run_dir else None
+    add_tasks = partial(add_table_tasks, checkpoints=checkpoints, compact=data_cleaning.compact_dtypes,
+                        last_stage=last_stage)
+
+    with DatabaseConnector() as database_connector:
+        if instrumentation is not None:
+            instrumentation.instrument(data_extraction, ['read_rds_table', 'read_rds_table_range', 'retrieve_pdf_data',
+                                                         'extract_from_s3', 'retrieve_stores_data', 'get_date_data'])
+            instrumentation.instrument(data_cleaning, ['clean_user_data', 'clean_card_data', 'clean_products_data',
+                                                       'called_clean_store_data', 'clean_orders_data', 'clean_event_date'])
+            instrumentation.instrument(database_connector, ['upload_to_db', 'upsert_to_db'])
+
+        def upload(df, table_name):
+            database_connector.upload_to_db(df, table_name, 'creds/db_creds.yaml', method='swap',
+                                            schema=SCHEMAS[table_name])
+            return df
+
+        def upsert(df, table_name):
+            database_connector.upsert_to_db(df, table_name, 'creds/db_creds.yaml', schema=SCHEMAS[table_name])
+            return df
+
+        def stream(index, clean, table_name, table_names, *_):
+            return stream_clean_upload(data_extraction, database_connector if uploading else None, engine,
+                                       table_names[index], clean if last_stage != 'extract' else None,
+                                       table_name, chunk_size)
+
+        pipeline = Pipeline()
+
+        # user and orders data from AWS RDS
+        previous_watermark = None if full_refresh else watermarks.get('orders_table')
+        if 'dim_users' in tables or 'orders_table' in tables:
+            # sets up the engine
+            read_yaml_file = database_connector.read_db_creds('creds/db_creds.yaml')
+            engine = database_connector.init_db_engine(read_yaml_file)
+            pipeline.add_task('table_names', lambda: database_connector.list_db_tables(engine))
+        if 'orders_table' in tables:
+            read_watermark = lambda table_names: data_extraction.get_rds_watermark(table_names[3], engine, 'index')
+            if checkpoints is not None:
+                # the raw orders checkpoint only has the orders up to this watermark, so a resumed
+                # run must save the same watermark rather than read a newer one
+                read_watermark = checkpoints.wrap('orders_table', 'watermark', read_watermark)
+            pipeline.add_task('orders_table:watermark', read_watermark, ['table_names'])
+        for table_name, index, clean, depends_on in (
+                ('dim_users', 2, data_cleaning.clean_user_data, ['table_names']),
+                ('orders_table', 3, data_cleaning.clean_orders_data, ['table_names', 'orders_table:watermark'])):
+            if table_name not in tables:
+                continue
+            if table_name == 'orders_table' and previous_watermark is not None:
+                # only the orders added since the last run are extracted and upserted
+                add_tasks(pipeline, table_name,
+                          lambda table_names, watermark: data_extraction.read_rds_table_range(
+                              table_names[3], engine, 'index', previous_watermark, watermark),
+                          clean, upsert, depends_on)
+            elif chunk_size:
+                pipeline.add_task(f'{table_name}:{last_stage}', partial(stream, index, clean, table_name), depends_on)
+            else:
+                add_tasks(pipeline, table_name,
+                          lambda table_names, *_, index=index: data_extraction.read_rds_table(table_names[index], engine),
+                          clean, upload, depends_on)
+        if 'orders_table' in tables and uploading:
+            pipeline.add_task('orders_table:save_watermark',
+                              lambda _, watermark: watermarks.set('orders_table', watermark),
+                              ['orders_table:upload', 'orders_table:watermark'])
+
+        # card details data from a pdf
+        if 'dim_card_details' in tables:
+            add_tasks(pipeline, 'dim_card_details', lambda: data_extraction.retrieve_pdf_data(pages_per_batch=25),
+                      data_cleaning.clean_card_data, upload)
+
+        # store data from the API
+        if 'dim_store_details' in tables:
+            add_tasks(pipeline, 'dim_store_details',
+                      lambda: data_extraction.retrieve_stores_data(data_extraction.list_number_of_stores()),
+                      data_cleaning.called_clean_store_data, upload)
+
+        # products data from the s3 bucket
+        if 'dim_products' in tables:
+            add_tasks(pipeline, 'dim_products', data_extraction.extract_from_s3,
+                      data_cleaning.clean_products_data, upload)
+
+        # date events data from the url
+        if 'dim_date_times' in tables:
+            add_tasks(pipeline, 'dim_date_times', data_extraction.get_date_data,
+                      data_cleaning.clean_event_date, upload)
+
+        if uploading:
+            # the foreign keys of the orders table are added again once the tables are loaded,
+            # as replacing a table drops the foreign keys referencing it
+            pipeline.add_task('foreign_keys',
+                              lambda *_: database_connector.add_foreign_keys(SCHEMAS.values(), 'creds/db_creds.yaml'),
+                              [f'{table_name}:upload' for table_name in tables])
+
+            # the sales rollup is refreshed for the months of the new orders, or rebuilt after a full
+            # load or when the products or stores were reloaded, as they change every month's totals
+            rollup_tables = [table_name for table_name in
+                             ('orders_table', 'dim_date_times', 'dim_products', 'dim_store_details') if table_name in tables]
+            if rollup_tables:
+                sales_rollup = SalesRollup()
+                local_engine = database_connector.init_local_engine('creds/db_creds.yaml')
+                upload_tasks = [f'{table_name}:upload' for table_name in rollup_tables]
+                if (previous_watermark is not None and 'orders_table' in rollup_tables
+                        and 'dim_products' not in rollup_tables and 'dim_store_details' not in rollup_tables):
+                    # the months of the new orders are looked up in the database, whether or not
+                    # the dates were reloaded in this run
+                    pipeline.add_task('sales_rollup', lambda watermark, *_: sales_rollup.refresh(
+                        local_engine, sales_rollup.changed_months(local_engine, previous_watermark, watermark)),
+                                      ['orders_table:watermark'] + upload_tasks)
+                else:
+                    pipeline.add_task('sales_rollup', lambda *_: sales_rollup.refresh(local_engine), upload_tasks)
+
+        try:
+            results = pipeline.run(max_workers)
+        except PipelineError as e:
+            print('\n'.join(summarise_tables(e.results, pipeline.durations, tables, last_stage)))
+            raise
+        else:
+            print('\n'.join(summarise_tables(results, pipeline.durations, tables, last_stage)))
+        finally:
+            # the rejected rows are kept in the run directory and in a quarantine_<column> table.
+            # Failing to save them is only reported, so it never hides the error of a failed table
+            for column_name, rejected in data_cleaning.quarantined_rows().items():
+                print(f"Quarantined {len(rejected)} rows because of their {column_name}")
+                try:
+                    if checkpoints is not None:
+                        checkpoints.save(rejected, f'quarantine_{column_name}', 'rejected')
+                    if uploading:
+                        database_connector.upload_to_db(rejected, f'quarantine_{column_name}', 'creds/db_creds.yaml')
+                except Exception as e:
+                    print(f"Error saving the rows quarantined because of their {column_name}: {e!r}")
+
+    return {table_name: results[f'{table_name}:{last_stage}'] for table_name in tables}
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract, clean and upload the retail data.")
+    parser.add_argument('--tables', help="comma separated tables to run, e.g. orders,dim_products (default: all)")
+    stage = parser.add_mutually_exclusive_group()
+    stage.add_argument('--extract-only', action='store_true', help="only extract the tables")
+    stage.add_argument('--no-upload', action='store_true', help="extract and clean the tables without uploading them")
+    stage.add_argument('--dry-run', action='store_true',
+                       help="extract and clean the tables and print their row counts and timings, "
+                            "without writing to the database, the watermark or a run directory")
+    parser.add_argument('--workers', type=int, default=6, help="the max number of tasks running at the same time")
+    parser.add_argument('--chunk-size', type=int,
+                        help="stream the user and orders tables from AWS RDS this many rows at a time")
+    parser.add_argument('--full-refresh', action='store_true',
+                        help="reload the whole orders table instead of only the new orders")
+    parser.add_argument('--refresh-cache', action='store_true',
+                        help="download the source files again even if the cached copies are up to date")
+    parser.add_argument('--cache-dir',
+                        help="cache the downloaded source files in this directory "
+                             "(default: .cache/artifacts, or no cache when nothing is uploaded)")
+    parser.add_argument('--run-dir', help="save the raw and cleaned dataframes in this directory")
+    parser.add_argument('--resume', action='store_true',
+                        help="reuse the dataframes already saved in --run-dir instead of extracting them again")
+    parser.add_argument('--report', help="write a json report of every stage's time, rows and memory to this file")
+    parser.add_argument('--metrics', help="write the stage metrics in the Prometheus text format to this file")
+    parser.add_argument('--profile-stage', help="profile one stage, e.g. DataCleaning.clean_user_data")
+    parser.add_argument('--cleaning-workers', type=int,
+                        help="clean the rows of large tables in this many processes at the same time")
+    args = parser.parse_args()
+    if args.resume and not args.run_dir:
+        parser.error("--resume needs --run-dir")
+    if args.dry_run and args.run_dir:
+        parser.error("--dry-run can't be used with --run-dir")
+    if args.dry_run and args.cache_dir:
+        parser.error("--dry-run can't be used with --cache-dir")
+    tables = None
+    if args.tables:
+        try:
+            tables = resolve_tables([name.strip() for name in args.tables.split(',') if name.strip()])
+        except ValueError as e:
+            parser.error(str(e))
+    last_stage = 'extract' if args.extract_only else 'clean' if args.no_upload or args.dry_run else 'upload'
+    # runs that don't upload leave no files behind unless a cache directory is given
+    cache_dir = args.cache_dir or ('.cache/artifacts' if last_stage == 'upload' else None)
+
     start_time = time.time()
-    user_data_df, card_detail_data_df, stores_df, product_data_df, order_data_df, date_event_df = main()
-    print(user_data_df)
-    print(card_detail_data_df)
-    print(stores_df)
-    print(product_data_df)
-    print(order_data_df)
-    print(date_event_df)
-    print(f"--- {time.time() - start_time} seconds ---" )
\ No newline at end of file
+    # the stages are only wrapped, and their memory only traced, when something is measured
+    instrumentation = None
+    if args.report or args.metrics or args.profile_stage:
+        instrumentation = Instrumentation(args.profile_stage, trace_memory=bool(args.report or args.metrics))
+    try:
+        main(chunk_size=args.chunk_size, max_workers=args.workers, full_refresh=args.full_refresh,
+             refresh_cache=args.refresh_cache, run_dir=args.run_dir, resume=args.resume,
+             instrumentation=instrumentation, cleaning_workers=args.cleaning_workers, tables=tables,
+             last_stage=last_stage, cache_dir=cache_dir)
+    finally:
+        if args.report:
+            instrumentation.write_report(args.report)
+        if args.metrics:
+            instrumentation.write_prometheus(args.metrics)
+    print(f"--- {time.time() - start_time:.1f} seconds ---")
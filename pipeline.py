@@ -0,0 +1,151 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class PipelineError(Exception):
+    '''
+    Raised by Pipeline.run when one or more tasks failed. The results of the tasks that
+    succeeded are still available.
+
+    Attributes:
+    ----------
+    results: dict
+        the return value of every task that succeeded, keyed by task name
+
+    errors: dict
+        the exception of every task that failed or was skipped, keyed by task name
+    '''
+    def __init__(self, results, errors):
+        self.results = results
+        self.errors = errors
+        super().__init__(f"{len(errors)} task(s) failed: {', '.join(errors)}")
+
+
+class Pipeline:
+    '''
+    Pipeline class runs a set of tasks (e.g. extract -> clean -> upload for each table) in a
+    thread pool. A task starts as soon as all the tasks it depends on have finished, so
+    independent tasks run at the same time.
+
+    Attributes:
+    ----------
+    durations: dict
+        the seconds each task of the last run took, keyed by task name (failed tasks included)
+
+    Methods:
+    -------
+    add_task(name, func, depends_on)
+        adds a task that is called with the results of the tasks it depends on
+
+    run(max_workers)
+        runs all the tasks and returns their results
+
+    run_task(name, func, *args)
+        runs one task and records its duration
+    '''
+    def __init__(self):
+        self.__tasks = {}
+        self.durations = {}
+
+    def add_task(self, name, func, depends_on=()):
+        '''
+        adds a task to the pipeline. The dependencies must already be in the pipeline,
+        which also means the tasks can never form a cycle.
+
+        Parameters:
+        -----------
+        name: str
+            the unique name of the task
+
+        func: function
+            the function to run, called with the results of depends_on as positional arguments
+
+        depends_on: list
+            the names of the tasks that have to finish before this one starts
+
+        Raises:
+        -------
+        ValueError: If the name is already used or a dependency is unknown.
+        '''
+        if name in self.__tasks:
+            raise ValueError(f"Task {name} already exists.")
+        for dependency in depends_on:
+            if dependency not in self.__tasks:
+                raise ValueError(f"Task {name} depends on unknown task {dependency}.")
+        self.__tasks[name] = (func, tuple(depends_on))
+
+    def run(self, max_workers=4):
+        '''
+        runs the tasks, at most max_workers at a time. A failing task does not stop the
+        others; only the tasks that depend on it are skipped.
+
+        Parameters:
+        -----------
+        max_workers: int
+            the max number of tasks running at the same time
+
+        Returns:
+        --------
+        results: dict
+            the return value of every task, keyed by task name
+
+        Raises:
+        -------
+        PipelineError: If any task failed, once every other task has finished.
+        '''
+        results = {}
+        errors = {}
+        self.durations = {}
+        pending = dict(self.__tasks)
+        running = {}
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            while pending or running:
+                for name, (func, depends_on) in list(pending.items()):
+                    failed = [dependency for dependency in depends_on if dependency in errors]
+                    if failed:
+                        errors[name] = RuntimeError(f"skipped because {failed[0]} failed")
+                        del pending[name]
+                    elif all(dependency in results for dependency in depends_on):
+                        future = executor.submit(self.run_task, name, func,
+                                                 *[results[dependency] for dependency in depends_on])
+                        running[future] = name
+                        del pending[name]
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        print(f"Task {name} failed: {e}")
+                        errors[name] = e
+        if errors:
+            raise PipelineError(results, errors)
+        return results
+
+    def run_task(self, name, func, *args):
+        '''
+        calls the function of a task and records how long it took
+
+        Parameters:
+        -----------
+        name: str
+            the name of the task
+
+        func: function
+            the function of the task
+
+        args:
+            the results of the tasks it depends on
+
+        Returns:
+        --------
+        result:
+            the return value of the function
+        '''
+        start_time = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.durations[name] = time.perf_counter() - start_time
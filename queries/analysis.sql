@@ -1,3 +1,8 @@
+/*
+ The sales queries (tasks 3, 4, 5, 6 and 8) read from sales_rollup, the sales pre-aggregated
+ by year, month, store_type and country_code that the pipeline refreshes after each load
+ (see sales_rollup.py).
+ */
 /*
  Task 1: How many stores does the bussiness have and in which country?
  */
@@ -17,45 +22,37 @@ ORDER BY total_no_stores DESC;
 /*
  Task 3: which month produced the largest amount of sales
  */
-SELECT SUM(product_price * product_quantity) AS total_sales,
+SELECT SUM(total_sales) AS total_sales,
     month
-FROM dim_products as products
-    LEFT JOIN orders_table as orders ON products.product_code = orders.product_code
-    LEFT JOIN dim_date_times ON orders.date_uuid = dim_date_times.date_uuid
+FROM sales_rollup
 GROUP BY month
 ORDER BY total_sales DESC;
 /*
  Task 4: how many sales are coming from online?
  */
-SELECT COUNT(product_quantity) as product_quantity_count,
-    SUM(product_quantity),
+SELECT SUM(order_count) as product_quantity_count,
+    SUM(total_quantity),
     CASE
         WHEN store_type = 'Web Portal' THEN 'Web'
         ELSE 'Offline'
     END AS location
-FROM dim_products as products
-    LEFT JOIN orders_table as orders ON products.product_code = orders.product_code
-    LEFT JOIN dim_store_details as stores ON orders.store_code = stores.store_code
+FROM sales_rollup
 GROUP BY location;
 /*
  Task 5: What percentage of sales comes through each type of store
  */
 SELECT store_type,
-    round(SUM(product_quantity * product_price)::numeric, 2) as sales,
-    round(SUM(product_quantity * product_price)::numeric, 2) / SUM(SUM(product_quantity * product_price)) OVER () as percentage
-FROM dim_store_details as stores
-    LEFT JOIN orders_table as orders ON stores.store_code = orders.store_code
-    LEFT JOIN dim_products as products on orders.product_code = products.product_code
+    round(SUM(total_sales)::numeric, 2) as sales,
+    round(SUM(total_sales)::numeric, 2) / SUM(SUM(total_sales)) OVER () as percentage
+FROM sales_rollup
 GROUP BY store_type;
 /*
  Task 6: Which month in each year produced the highest cost in sales?
  */
-SELECT SUM(product_price * product_quantity) AS total_sales,
+SELECT SUM(total_sales) AS total_sales,
     year,
     month
-FROM dim_products as products
-    LEFT JOIN orders_table as orders ON products.product_code = orders.product_code
-    LEFT JOIN dim_date_times as times ON orders.date_uuid = times.date_uuid
+FROM sales_rollup
 GROUP BY year,
     month
 ORDER BY total_sales DESC;
@@ -70,11 +67,9 @@ GROUP BY country_code;
  Task 8: Which German Store Type is selling the most?
  */
 SELECT store_type,
-    round(SUM(product_quantity * product_price)::numeric, 2) as total_sales,
+    round(SUM(total_sales)::numeric, 2) as total_sales,
     country_code
-FROM dim_store_details as stores
-    LEFT JOIN orders_table as orders ON stores.store_code = orders.store_code
-    LEFT JOIN dim_products as products on orders.product_code = products.product_code
+FROM sales_rollup
 WHERE country_code = 'DE'
 GROUP BY store_type,
     country_code
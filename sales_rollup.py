@@ -0,0 +1,130 @@
+import time
+
+from sqlalchemy import BigInteger, Float, String, or_, text
+
+from schema_registry import TableSchema
+
+
+class SalesRollup:
+    '''
+    Sales Rollup class maintains a table of the sales pre-aggregated by year, month, store type
+    and country code, so the analysis queries read a few thousand rows instead of joining the
+    whole orders table with the products, stores and dates tables every time.
+
+    The rollup can be rebuilt from scratch, or refreshed for only the months of the newly loaded
+    orders: the rows of those months are deleted and aggregated again, so a refresh can safely
+    be repeated. Only the months of the new orders change, so the rollup must be rebuilt after
+    the products or stores tables are reloaded. Orders without a matching date, product or
+    store are left out, as they can't be put in a month, store type or country.
+
+    Attributes:
+    ----------
+    schema: TableSchema
+        the columns of the rollup table
+
+    Methods:
+    -------
+    refresh(engine, months)
+        rebuilds the rollup, or only the given (year, month) rows
+
+    changed_months(engine, lower, upper)
+        returns the (year, month) pairs of the orders loaded between two watermarks
+    '''
+    schema = TableSchema('sales_rollup', {
+        'year': String(4),
+        'month': String(2),
+        'store_type': String(255),
+        'country_code': String(3),
+        'total_sales': Float(),
+        'total_quantity': Float(),
+        'order_count': BigInteger(),
+    })
+
+    aggregate_sql = '''
+        INSERT INTO sales_rollup (year, month, store_type, country_code, total_sales, total_quantity, order_count)
+        SELECT dates.year,
+            dates.month,
+            stores.store_type,
+            stores.country_code,
+            SUM(products.product_price * orders.product_quantity),
+            SUM(orders.product_quantity),
+            COUNT(orders.product_quantity)
+        FROM orders_table AS orders
+            JOIN dim_date_times AS dates ON orders.date_uuid = dates.date_uuid
+            JOIN dim_products AS products ON orders.product_code = products.product_code
+            JOIN dim_store_details AS stores ON orders.store_code = stores.store_code
+        {where}
+        GROUP BY dates.year,
+            dates.month,
+            stores.store_type,
+            stores.country_code
+    '''
+
+    def refresh(self, engine, months=None):
+        '''
+        aggregates the sales into the rollup table in one transaction. If months is None the
+        table is rebuilt from all the orders, otherwise only the rows of those months are.
+
+        Parameters:
+        -----------
+        engine: sqlalchemy.engine.Engine
+            the engine connected to the local database
+
+        months: list
+            the (year, month) pairs to refresh, e.g. [('2022', '5')]
+
+        Returns:
+        --------
+        months: list or None
+            the months refreshed
+        '''
+        table = self.schema.to_table()
+        start_time = time.perf_counter()
+        with engine.begin() as connection:
+            table.create(connection, checkfirst=True)
+            if months is None:
+                connection.execute(table.delete())
+                connection.execute(text(self.aggregate_sql.format(where='')))
+            else:
+                # rows without a month (left by rollups built with outer joins) are never refreshed
+                connection.execute(table.delete().where(or_(table.c.year.is_(None), table.c.month.is_(None))))
+                for year, month in months:
+                    connection.execute(table.delete().where(table.c.year == year, table.c.month == month))
+                    connection.execute(text(self.aggregate_sql.format(
+                        where='WHERE dates.year = :year AND dates.month = :month')),
+                        {'year': year, 'month': month})
+        elapsed = time.perf_counter() - start_time
+        refreshed = 'all months' if months is None else f"{len(months)} months"
+        print(f"Refreshed {refreshed} of sales_rollup in {elapsed:.2f} seconds")
+        return months
+
+    @staticmethod
+    def changed_months(engine, lower, upper):
+        '''
+        returns the (year, month) pairs of the orders with lower < index <= upper, looked up in
+        the dates table of the database, so the dates don't have to be reloaded with the orders
+
+        Parameters:
+        -----------
+        engine: sqlalchemy.engine.Engine
+            the engine connected to the local database
+
+        lower: int
+            the watermark of the previous run
+
+        upper: int
+            the watermark of the orders just loaded
+
+        Returns:
+        --------
+        months: list
+            the distinct (year, month) pairs
+        '''
+        with engine.connect() as connection:
+            months = connection.execute(text('''
+                SELECT DISTINCT dates.year, dates.month
+                FROM orders_table AS orders
+                    JOIN dim_date_times AS dates ON orders.date_uuid = dates.date_uuid
+                WHERE orders."index" > :lower AND orders."index" <= :upper
+            '''), {'lower': lower, 'upper': upper})
+            return [(year, month) for year, month in months if year is not None and month is not None]
@@ -0,0 +1,233 @@
+import re
+
+import pandas as pd
+from sqlalchemy import (BigInteger, Boolean, Column, DateTime, Float, Integer, MetaData, SmallInteger, String,
+                        Table, Text, Uuid)
+
+
+class TableSchema:
+    '''
+    Table Schema class declares the SQL type of every column of a table, its primary key and its
+    foreign keys. It is used to create the table with the right types before it's loaded and to
+    cast the cleaned dataframe to those types, so bad values are caught before they reach the
+    database.
+
+    Attributes:
+    ----------
+    name: str
+        the name of the table
+
+    columns: dict
+        the SQLAlchemy type of each column, in the order of the table
+
+    primary_key: list
+        the columns of the primary key
+
+    unique_key: list
+        the columns identifying a row when it's upserted (the primary key unless given)
+
+    foreign_keys: dict
+        the (table, column) referenced by each foreign key column
+
+    Methods:
+    -------
+    to_table(metadata)
+        returns the SQLAlchemy Table of the schema
+
+    cast(df)
+        returns the dataframe with its columns cast to the types of the schema
+
+    cast_column(values, column_type)
+        casts one column to an SQLAlchemy type
+    '''
+    def __init__(self, name, columns, primary_key=(), foreign_keys=None, unique_key=None):
+        self.name = name
+        self.columns = columns
+        self.primary_key = list(primary_key)
+        self.foreign_keys = foreign_keys or {}
+        self.unique_key = list(unique_key) if unique_key is not None else self.primary_key
+
+    def to_table(self, metadata=None, name=None, primary_key=True):
+        '''
+        returns the SQLAlchemy Table of the schema with its primary key. The foreign keys are
+        left out so the tables can be loaded in any order; they're added once every table is loaded.
+
+        Parameters:
+        -----------
+        metadata: MetaData
+            the metadata the table is added to
+
+        name: str
+            the name of the table, if not the schema's (e.g. a staging table)
+
+        primary_key: bool
+            if False, the table is created without its primary key (to add it after loading)
+
+        Returns:
+        --------
+        table: sqlalchemy.Table
+            the table
+        '''
+        return Table(name or self.name, metadata if metadata is not None else MetaData(),
+                     *(Column(column_name, column_type, primary_key=primary_key and column_name in self.primary_key)
+                       for column_name, column_type in self.columns.items()))
+
+    def cast(self, df):
+        '''
+        casts every column of the dataframe to the type of the schema and puts the columns in
+        the order of the table.
+
+        Parameters:
+        -----------
+        df: DataFrame
+            the cleaned dataframe
+
+        Returns:
+        --------
+        df: DataFrame
+            the cast dataframe
+
+        Raises:
+        -------
+        ValueError: If a column is missing or unknown, a value can't be cast, or a primary key
+            value is missing.
+        '''
+        unknown_columns = [column for column in df.columns if column not in self.columns]
+        missing_columns = [column for column in self.columns if column not in df.columns]
+        if unknown_columns or missing_columns:
+            raise ValueError(f"The columns of {self.name} don't match its schema: "
+                             f"unknown {unknown_columns}, missing {missing_columns}")
+        cast_df = pd.DataFrame(index=df.index)
+        for column_name, column_type in self.columns.items():
+            try:
+                cast_df[column_name] = self.cast_column(df[column_name], column_type)
+            except ValueError as e:
+                raise ValueError(f"{self.name}.{column_name}: {e}") from None
+        for column_name in self.primary_key:
+            if cast_df[column_name].isna().any():
+                raise ValueError(f"{self.name}.{column_name}: the primary key has missing values")
+        return cast_df
+
+    @staticmethod
+    def cast_column(values, column_type):
+        '''
+        casts a column to an SQLAlchemy type. Missing values stay missing; any other value that
+        can't be cast raises a ValueError naming a few of them.
+
+        Parameters:
+        -----------
+        values: Series
+            the column to cast
+
+        column_type: sqlalchemy type
+            the type of the column in the table
+
+        Returns:
+        --------
+        values: Series
+            the cast column
+        '''
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(values.cat.categories.dtype)
+        missing = values.isna()
+        if isinstance(column_type, (SmallInteger, Integer, BigInteger)):
+            cast_values = pd.to_numeric(values, errors='coerce')
+            invalid = cast_values.notna() & (cast_values % 1 != 0)
+            cast_values = cast_values.where(~invalid).astype('Int64')
+        elif isinstance(column_type, Float):
+            cast_values = pd.to_numeric(values, errors='coerce').astype(float)
+        elif isinstance(column_type, DateTime):
+            cast_values = pd.to_datetime(values, errors='coerce')
+        elif isinstance(column_type, Boolean):
+            cast_values = values.map({True: True, False: False}, na_action='ignore').astype('boolean')
+        elif isinstance(column_type, (String, Text, Uuid)):
+            if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+                # whole numbers read as floats (e.g. card numbers next to missing values)
+                values = values.astype('Int64')
+            cast_values = values.astype(object).where(~missing, None).map(str, na_action='ignore')
+            if isinstance(column_type, Uuid):
+                # postgresql also accepts uuids without hyphens
+                uuid_pattern = re.compile(r'^[0-9a-fA-F]{8}-?(?:[0-9a-fA-F]{4}-?){3}[0-9a-fA-F]{12}$')
+                cast_values = cast_values.where(cast_values.map(
+                    lambda value: value is None or bool(uuid_pattern.match(value)), na_action='ignore'))
+            elif getattr(column_type, 'length', None):
+                cast_values = cast_values.where(cast_values.str.len() <= column_type.length)
+        else:
+            raise ValueError(f"unsupported column type {column_type!r}")
+        invalid = cast_values.isna() & ~missing
+        if invalid.any():
+            examples = ', '.join(repr(value) for value in values[invalid].unique()[:3])
+            raise ValueError(f"{invalid.sum()} values can't be cast to {column_type!r}, e.g. {examples}")
+        return cast_values
+
+
+SCHEMAS = {schema.name: schema for schema in (
+    TableSchema('dim_users', {
+        'index': BigInteger(),
+        'first_name': String(255),
+        'last_name': String(255),
+        'date_of_birth': DateTime(),
+        'company': Text(),
+        'email_address': Text(),
+        'address': Text(),
+        'country': Text(),
+        'country_code': String(2),
+        'phone_number': Text(),
+        'join_date': DateTime(),
+        'user_uuid': Uuid(as_uuid=False),
+    }, primary_key=['user_uuid']),
+    TableSchema('dim_card_details', {
+        'card_number': String(19),
+        'expiry_date': String(5),
+        'card_provider': String(255),
+        'date_payment_confirmed': DateTime(),
+    }, primary_key=['card_number']),
+    TableSchema('dim_store_details', {
+        'index': BigInteger(),
+        'address': Text(),
+        'longitude': Float(),
+        'locality': String(255),
+        'store_code': String(13),
+        'staff_numbers': SmallInteger(),
+        'opening_date': DateTime(),
+        'store_type': String(255),
+        'latitude': Float(),
+        'country_code': String(3),
+        'continent': String(255),
+    }, primary_key=['store_code']),
+    TableSchema('dim_products', {
+        'product_name': Text(),
+        'product_price': Float(),
+        'weight': Float(),
+        'category': Text(),
+        'EAN': String(255),
+        'date_added': DateTime(),
+        'uuid': Uuid(as_uuid=False),
+        'still_available': Boolean(),
+        'product_code': String(11),
+        'weight_class': String(255),
+    }, primary_key=['product_code']),
+    TableSchema('orders_table', {
+        'index': BigInteger(),
+        'date_uuid': Uuid(as_uuid=False),
+        'user_uuid': Uuid(as_uuid=False),
+        'card_number': String(19),
+        'store_code': String(12),
+        'product_code': String(11),
+        'product_quantity': Float(),
+    }, foreign_keys={
+        'date_uuid': ('dim_date_times', 'date_uuid'),
+        'user_uuid': ('dim_users', 'user_uuid'),
+        'card_number': ('dim_card_details', 'card_number'),
+        'store_code': ('dim_store_details', 'store_code'),
+        'product_code': ('dim_products', 'product_code'),
+    }, unique_key=['date_uuid']),
+    TableSchema('dim_date_times', {
+        'timestamp': Text(),
+        'month': String(2),
+        'year': String(4),
+        'day': String(2),
+        'time_period': String(10),
+        'date_uuid': Uuid(as_uuid=False),
+    }, primary_key=['date_uuid']),
+)}
@@ -0,0 +1,122 @@
+import functools
+import threading
+import types
+
+
+class Settings:
+    '''
+    Settings class holds the values of a yaml settings file (e.g. creds/api_creds.yaml). The
+    file isn't read until a value is first needed, and is parsed only once per process however
+    many objects use it. The required keys are checked when it's parsed, so a missing setting
+    fails straight away rather than halfway through a run.
+
+    Attributes:
+    ----------
+    path: str
+        the location of the yaml file
+
+    required_keys: tuple
+        the keys the file must have
+
+    Methods:
+    -------
+    values
+        the parsed settings, read on first use
+
+    get(key, default)
+        returns a setting, or the default if it isn't set
+
+    load(path, required_keys)
+        returns the settings of a yaml file after checking it has the required keys
+
+    read(path)
+        parses a yaml file, once per path
+    '''
+    def __init__(self, path, required_keys=()):
+        self.path = path
+        self.required_keys = tuple(required_keys)
+        self.__values = None
+        self.__lock = threading.Lock()
+
+    @property
+    def values(self):
+        '''
+        the parsed settings, read from the file the first time they're needed
+
+        Raises:
+        -------
+        ValueError: If the file can't be parsed or a required key is missing.
+        '''
+        if self.__values is None:
+            with self.__lock:
+                if self.__values is None:
+                    self.__values = self.load(self.path, self.required_keys)
+        return self.__values
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def get(self, key, default=None):
+        '''
+        returns the value of a setting, or the default if it isn't set
+        '''
+        return self.values.get(key, default)
+
+    @staticmethod
+    def load(path, required_keys=()):
+        '''
+        returns the settings of a yaml file after checking it has the required keys. The file
+        is only read once per process (see read).
+
+        Parameters:
+        -----------
+        path: str
+            the location of the yaml file
+
+        required_keys: tuple
+            the keys the file must have
+
+        Returns:
+        --------
+        values: mappingproxy
+            the read-only settings
+
+        Raises:
+        -------
+        ValueError: If the file can't be parsed, isn't a mapping or a required key is missing.
+        '''
+        values = Settings.read(path)
+        missing_keys = [key for key in required_keys if key not in values]
+        if missing_keys:
+            raise ValueError(f"{path} is missing the settings {', '.join(missing_keys)}")
+        return values
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def read(path):
+        '''
+        parses a yaml settings file. The result is cached, so each file is only parsed once.
+
+        Parameters:
+        -----------
+        path: str
+            the location of the yaml file
+
+        Returns:
+        --------
+        values: mappingproxy
+            the read-only settings
+
+        Raises:
+        -------
+        ValueError: If the file can't be parsed or isn't a mapping.
+        '''
+        import yaml
+        try:
+            with open(path, 'r') as file:
+                values = yaml.safe_load(file) or {}
+        except yaml.YAMLError as e:
+            raise ValueError(f"Error reading YAML file {path}: {e}") from None
+        if not isinstance(values, dict):
+            raise ValueError(f"{path} must contain a mapping of settings")
+        return types.MappingProxyType(values)
@@ -0,0 +1,134 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# the modules of the project are at the top level of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_raw_tables():
+    '''
+    Returns small raw tables shaped like the extracted ones, with the dirty values each cleaner
+    has to deal with: 'NULL'/'N/A' strings, garbage rows of 10 character codes, dates in every
+    format, '@@' emails, 'GGB' country codes, prefixed phone numbers and multiplied weights.
+    '''
+    return {
+        'dim_users': pd.DataFrame({
+            'index': [0, 1, 2, 3, 4, 5, 6, 7],
+            'first_name': ['Sigfried', 'Guy', 'NULL', 'Harry', 'Anna', 'I7G4DMDZOZ', 'Guy', 'Anna'],
+            'last_name': ['Noack', 'Allen', 'Lawrence', 'Smith', 'Noack', 'AJ1ENKS3QL', 'Allen', 'Smith'],
+            'date_of_birth': ['1968-10-16', '1940 June 07', 'July 1961 14', '1998/03/22', 'NULL',
+                              'GLQ6ZH7RJ1', '2001-02-30', '1975-12-01'],
+            'company': ['Heydrich Junitz KG', 'Lewis LLC', 'Cooper-Dyer', 'Lewis LLC', 'Cooper-Dyer',
+                        '3HFTVBF4V7', 'Lewis LLC', 'Heydrich Junitz KG'],
+            'email_address': ['sigfried@example.com', 'guy@@example.org', 'null@mail.de', 'harry@example',
+                              'anna@mail.de', 'VZ0GB6ATWK', 'guy@example.com', 'anna@mail.de'],
+            'address': ['Zimmerstr. 1/0\n59015 Gießen', '44 Jones Street\nLondon', 'N/A', '44 Jones Street\nLondon',
+                        'Zimmerstr. 1/0\n59015 Gießen', 'QX3BVS7MOS', '1 Main Street\nBoston', 'N/A'],
+            'country': ['Germany', 'United Kingdom', 'United Kingdom', 'NULL', 'Germany', 'PG8MOC0UZI',
+                        'United States', 'United Kingdom'],
+            'country_code': ['DE', 'GGB', 'GB', 'NULL', 'DE', 'XGII6Y3UT1', 'US', 'GB'],
+            'phone_number': ['+49(0)047905356', '+44(0)1184960109', '(0161) 496 0674', '030 999321',
+                             '+49(0)047905356', 'Q6ODUNLBDD', '+1-403-283-9012x1234', '001-403.283.9012'],
+            'join_date': ['2018-10-10', '2002 March 01', 'October 2012 23', '2009/11/05', '2016-06-30',
+                          'ZP9VYL7M34', 'NULL', '2020-01-01'],
+            'user_uuid': ['93caf182-e4e9-4c6e-bebb-60a1a9dcf9b8', '8fe96c3a-d62d-4eb5-b313-cf12d9126a49',
+                          'fc461df4-b919-48b2-909e-55c95a03fe6b', '6104719f-ef14-4b09-bf04-fb0c4620acb0',
+                          '9523a6d3-b2dd-4670-a51a-36aebc89f579', 'CBXOOSPZCY', '3f3b8d0b-6b7d-4c55-9c26-4a0a0d3f3f3f',
+                          'a1b2c3d4-e5f6-4a7b-8c9d-0e1f2a3b4c5d'],
+        }),
+        'dim_card_details': pd.DataFrame({
+            'card_number': ['30060773296197', '???4971858637664481', 'NULL', '349624180933183', '4252720361802860591',
+                            '12345678', 'RNSCD8OQRM', '3525023052489013'],
+            'expiry_date': ['09/26', '10/23', 'NULL', '02/31', '04/27', '11/25', 'RNSCD8OQRM', '12/22'],
+            'card_provider': ['Diners Club / Carte Blanche', 'VISA 19 digit', 'NULL', 'American Express',
+                              'VISA 19 digit', 'VISA 16 digit', 'RNSCD8OQRM', 'JCB 16 digit'],
+            'date_payment_confirmed': ['2015-11-25', '2001 June 18', 'NULL', 'December 2021 17', '2022/05/07',
+                                       '2010-01-01', 'RNSCD8OQRM', '1999-02-31'],
+        }),
+        'dim_products': pd.DataFrame({
+            'Unnamed: 0': [0, 1, 2, 3, 4, 5, 6, 7],
+            'product_name': ['FurReal Dazzlin Dimples', 'Tiffany Cut Glass Vase', 'Tefal Saucepan', 'Dog Bed',
+                             'Pasta Bake', 'S1YB74MLMJ', 'Garden Hose', 'Face Cream'],
+            'product_price': ['£39.99', '£9.99', '£79.49', '£24.00', '£2.50', 'C3NCA2CL35', '£18.00', '£6.75'],
+            'weight': ['1.6kg', '12 x 100g', '5oz', '77g .', '400ml', 'WVPMHZP59U', '3 x 2g', '2kg'],
+            'category': ['toys-and-games', 'homeware', 'homeware', 'pets', 'food-and-drink', 'C3NCA2CL35',
+                         'diy', 'health-and-beauty'],
+            'EAN': ['6716266547817', '7425710935115', '4090186537307', '2561498813287', '1312419018853',
+                    'WVPMHZP59U', '8471905719280', '5918504758923'],
+            'date_added': ['2005-12-02', '2006 September 03', 'January 2008 11', '2016/04/16', '2000-01-01',
+                           'S1YB74MLMJ', 'NULL', '2019-08-14'],
+            'uuid': ['83dc0a69-f96f-4c34-bcb7-928acae19a94', '712254d7-aea7-4310-9a7c-f3df28a40a3f',
+                     'b89dc0b0-fe62-48db-848d-bc6c6146a63c', '9ac0e1b7-ff13-48b4-ba21-e22f0c8a1234',
+                     '4d3f1d8e-7a6b-4f0c-9b1a-2c3d4e5f6a7b', 'S1YB74MLMJ', '0f1e2d3c-4b5a-4968-8776-a5b4c3d2e1f0',
+                     'c0ffee00-1234-4abc-8def-0123456789ab'],
+            'removed': ['Still_avaliable', 'Removed', 'Still_avaliable', 'Still_avaliable', 'Removed',
+                        '7QB0Z9EW1G', 'Still_avaliable', 'Still_avaliable'],
+            'product_code': ['R7-3126933h', 'C2-7287916l', 'S7-1175877v', 'P8-2231212x', 'F4-4480090a',
+                             'S1YB74MLMJ', 'D2-5568119s', 'H9-1209876c'],
+        }),
+        'dim_store_details': pd.DataFrame({
+            'index': [0, 1, 2, 3, 4, 5, 6, 7],
+            'address': ['N/A', 'Flat 72W\nSally isle\nEast Deantown\nE7B 8EB', 'Heckerstraße 4/5\n50491 Säckingen',
+                        'Flat 72W\nSally isle\nEast Deantown\nE7B 8EB', 'NULL', 'QMAVR5H3LD', '1 Main Street\nBoston',
+                        'Heckerstraße 4/5\n50491 Säckingen'],
+            'longitude': ['N/A', '-0.74934', '12.16', '-2.8', 'NULL', 'QMAVR5H3LD', '-71.05977', '181.5'],
+            'lat': [None, None, None, None, None, 'QMAVR5H3LD', None, '13.1'],
+            'locality': ['N/A', 'High Wycombe', 'Landshut', 'Lancaster', 'NULL', 'QMAVR5H3LD', 'Boston', 'Landshut'],
+            'store_code': ['WEB-1388012W', 'HI-9B97EE4E', 'LA-0772C7B9', 'LAN-1F46D7A3', 'NULL', 'QMAVR5H3LD',
+                           'BO-3C1C7E2F', 'LA-8B2D1A4E'],
+            'staff_numbers': ['325', '34', 'J78', '    ', 'NULL', 'QMAVR5H3LD', '17', '9'],
+            'opening_date': ['2010-06-12', '1996 October 25', 'May 2006 08', '2016/02/29', 'NULL', 'QMAVR5H3LD',
+                             '2012-04-01', '2003-03-03'],
+            'store_type': ['Web Portal', 'Local', 'Super Store', 'Mall Kiosk', 'NULL', 'QMAVR5H3LD', 'Outlet',
+                           'Local'],
+            'latitude': [None, '51.62907', '48.52961', '54.0', 'NULL', 'QMAVR5H3LD', '42.36008', None],
+            'country_code': ['GB', 'GB', 'DE', 'GB', 'NULL', 'QMAVR5H3LD', 'US', 'DE'],
+            'continent': ['Europe', 'eeEurope', 'Europe', 'Europe', 'NULL', 'QMAVR5H3LD', 'eeAmerica', 'Europe'],
+        }),
+        'orders_table': pd.DataFrame({
+            'level_0': [0, 1, 2, 3, 4, 5, 6, 7],
+            'index': [0, 1, 2, 3, 4, 5, 6, 7],
+            'date_uuid': ['9476f17e-5d6a-4117-874d-9cdb38ca1fa8', '0423a395-a04d-4e4a-bd0f-d237cbd5a295',
+                          'e5c9b8a4-3d2c-4b1a-8f7e-6d5c4b3a2f1e', '1a2b3c4d-5e6f-4a7b-8c9d-0e1f2a3b4c5d',
+                          'abcdef01-2345-4678-9abc-def012345678', '11111111-2222-4333-8444-555555555555',
+                          '66666666-7777-4888-9999-aaaaaaaaaaaa', 'bbbbbbbb-cccc-4ddd-8eee-ffffffffffff'],
+            'first_name': [None, None, 'Guy', None, None, None, None, None],
+            'last_name': [None, None, None, None, 'Allen', None, None, None],
+            'user_uuid': ['93caf182-e4e9-4c6e-bebb-60a1a9dcf9b8', '8fe96c3a-d62d-4eb5-b313-cf12d9126a49',
+                          'fc461df4-b919-48b2-909e-55c95a03fe6b', '6104719f-ef14-4b09-bf04-fb0c4620acb0',
+                          '9523a6d3-b2dd-4670-a51a-36aebc89f579', '93caf182-e4e9-4c6e-bebb-60a1a9dcf9b8',
+                          '8fe96c3a-d62d-4eb5-b313-cf12d9126a49', 'fc461df4-b919-48b2-909e-55c95a03fe6b'],
+            'card_number': [30060773296197, 349624180933183, 3525023052489013, 4971858637664481, 30060773296197,
+                            349624180933183, 3525023052489013, 4971858637664481],
+            'store_code': ['BL-8387506C', 'WEB-1388012W', 'CH-01C8EA0E', 'LA-0772C7B9', 'HI-9B97EE4E',
+                           'WEB-1388012W', 'LA-0772C7B9', 'BL-8387506C'],
+            'product_code': ['R7-3126933h', 'C2-7287916l', 'S7-1175877v', 'P8-2231212x', 'F4-4480090a',
+                             'R7-3126933h', 'D2-5568119s', 'H9-1209876c'],
+            '1': [None, None, None, 1.0, None, None, None, None],
+            'product_quantity': [3, 2, 2, 1, 7, 4, 13, 1],
+        }),
+        'dim_date_times': pd.DataFrame({
+            'timestamp': ['22:00:06', '22:44:06', '10:05:37.0', 'NULL', '00:00:00', 'DXBU6GX1VC', '17:29:45',
+                          '25:61:00'],
+            'month': ['9', '2', '11', 'NULL', '12', 'DXBU6GX1VC', '13', '7'],
+            'year': ['2012', '1997', '1994', 'NULL', '2021', 'DXBU6GX1VC', '2008', '94'],
+            'day': ['19', '10', '14', 'NULL', '31', 'DXBU6GX1VC', '32', '1'],
+            'time_period': ['Evening', 'Evening', 'Morning', 'NULL', 'Late_Hours', 'DXBU6GX1VC', 'Midday',
+                            'Morning'],
+            'date_uuid': ['3b7ca996-37f9-433f-b6d0-ce8391b615ad', 'adc86836-6c35-49ca-bb0d-65b6507a00fa',
+                          '5ff791bf-d15f-4dc1-8a5e-6c9e0cbd3bc3', '1b01fcef-5ab9-404c-b0d4-1e75a0bd19d8',
+                          'dfa907c1-f6c5-40f0-aa0e-40ed1ac0e7d2', 'DXBU6GX1VC', '9f5b1e3e-2a4c-4d6e-8f0a-1b2c3d4e5f6a',
+                          '0e9d8c7b-6a5f-4e3d-9c2b-1a0f9e8d7c6b'],
+        }, index=[str(row) for row in range(8)]),
+    }
+
+
+@pytest.fixture
+def raw_tables():
+    '''
+    a fresh copy of the small raw tables of make_raw_tables, as the cleaners change them in place
+    '''
+    return make_raw_tables()
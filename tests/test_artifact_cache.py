@@ -0,0 +1,135 @@
+import hashlib
+import io
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from artifact_cache import ArtifactCache
+
+
+class FileServer(BaseHTTPRequestHandler):
+    '''
+    Serves files[path] with an ETag and answers 304 Not Modified when the client already has it.
+    downloads counts the 200 responses of each path.
+    '''
+    files = {}
+    downloads = {}
+
+    def do_GET(self):
+        content = self.files[self.path]
+        etag = f'"{hashlib.md5(content).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.downloads[self.path] = self.downloads.get(self.path, 0) + 1
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class S3Client:
+    '''
+    Stands in for a boto3 S3 client with the objects of one bucket held in memory.
+    '''
+    def __init__(self, objects):
+        self.objects = objects
+        self.downloads = 0
+
+    def head_object(self, Bucket, Key):
+        return {'ETag': f'"{hashlib.md5(self.objects[Key]).hexdigest()}"'}
+
+    def get_object(self, Bucket, Key):
+        self.downloads += 1
+        return {'Body': io.BytesIO(self.objects[Key]), 'ETag': self.head_object(Bucket, Key)['ETag'],
+                'LastModified': None}
+
+
+@pytest.fixture
+def file_server():
+    FileServer.files = {}
+    FileServer.downloads = {}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FileServer)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def cached_files(cache):
+    return sorted(os.listdir(os.path.join(cache.cache_dir, 'objects')))
+
+
+def test_unchanged_url_is_not_downloaded_again(tmp_path, file_server):
+    FileServer.files['/dates.json'] = b'{"year": [2022]}'
+    cache = ArtifactCache(str(tmp_path))
+    first_path = cache.fetch_url(f"{file_server}/dates.json")
+    second_path = cache.fetch_url(f"{file_server}/dates.json")
+    assert first_path == second_path
+    assert FileServer.downloads['/dates.json'] == 1
+    with open(second_path, 'rb') as file:
+        assert file.read() == b'{"year": [2022]}'
+
+
+def test_changed_url_replaces_the_old_file(tmp_path, file_server):
+    FileServer.files['/dates.json'] = b'old'
+    cache = ArtifactCache(str(tmp_path))
+    old_path = cache.fetch_url(f"{file_server}/dates.json")
+    FileServer.files['/dates.json'] = b'new'
+    new_path = cache.fetch_url(f"{file_server}/dates.json")
+    assert FileServer.downloads['/dates.json'] == 2
+    assert not os.path.exists(old_path)
+    assert cached_files(cache) == [os.path.basename(new_path)]
+
+
+def test_changed_object_keeps_a_file_another_source_uses(tmp_path):
+    s3_client = S3Client({'products.csv': b'same', 'products_copy.csv': b'same'})
+    cache = ArtifactCache(str(tmp_path))
+    shared_path = cache.fetch_s3(s3_client, 'bucket', 'products.csv')
+    assert cache.fetch_s3(s3_client, 'bucket', 'products_copy.csv') == shared_path
+    s3_client.objects['products.csv'] = b'changed'
+    cache.fetch_s3(s3_client, 'bucket', 'products.csv')
+    assert os.path.exists(shared_path)
+    assert len(cached_files(cache)) == 2
+
+
+def test_unchanged_object_is_not_downloaded_again(tmp_path):
+    s3_client = S3Client({'products.csv': b'product_name,weight\nbread,400g\n'})
+    cache = ArtifactCache(str(tmp_path))
+    first_path = cache.fetch_s3(s3_client, 'bucket', 'products.csv')
+    assert cache.fetch_s3(s3_client, 'bucket', 'products.csv') == first_path
+    assert s3_client.downloads == 1
+
+
+def test_file_larger_than_the_cache_is_still_returned(tmp_path):
+    s3_client = S3Client({'products.csv': b'x' * 100})
+    cache = ArtifactCache(str(tmp_path), max_bytes=10)
+    with open(cache.fetch_s3(s3_client, 'bucket', 'products.csv'), 'rb') as file:
+        assert file.read() == b'x' * 100
+
+
+def test_least_recently_used_file_is_evicted(tmp_path):
+    s3_client = S3Client({'a': b'a' * 10, 'b': b'b' * 10, 'c': b'c' * 10})
+    cache = ArtifactCache(str(tmp_path), max_bytes=20)
+    a_path = cache.fetch_s3(s3_client, 'bucket', 'a')
+    b_path = cache.fetch_s3(s3_client, 'bucket', 'b')
+    cache.fetch_s3(s3_client, 'bucket', 'a')
+    c_path = cache.fetch_s3(s3_client, 'bucket', 'c')
+    assert os.path.exists(a_path) and os.path.exists(c_path)
+    assert not os.path.exists(b_path)
+    assert 's3://bucket/b' not in cache.read_index()
+
+
+def test_cache_directory_is_only_created_when_a_file_is_stored(tmp_path):
+    cache = ArtifactCache(str(tmp_path / 'cache'))
+    assert not (tmp_path / 'cache').exists()
+    cache.fetch_s3(S3Client({'products.csv': b'bread'}), 'bucket', 'products.csv')
+    assert sorted(os.listdir(tmp_path / 'cache')) == ['index.json', 'objects']
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from checkpoint_store import CheckpointStore
+
+
+def test_nan_and_none_are_kept_apart(tmp_path):
+    df = pd.DataFrame({'address': ['1 Main Street', np.nan, None], 'staff_numbers': [3.0, np.nan, 1.0]},
+                      index=['a', 'b', 'c'])
+    checkpoints = CheckpointStore(str(tmp_path))
+    checkpoints.save(df, 'dim_store_details', 'raw')
+    loaded = checkpoints.load('dim_store_details', 'raw')
+    pd.testing.assert_frame_equal(loaded, df)
+    assert isinstance(loaded.at['b', 'address'], float)
+    assert loaded.at['c', 'address'] is None
+
+
+def missing_values(df):
+    return {column: [type(value) for value in df[column] if pd.isna(value)] for column in df.columns}
+
+
+@pytest.mark.parametrize('table_name', ['dim_users', 'dim_store_details', 'dim_products', 'dim_date_times'])
+def test_raw_checkpoint_loads_the_same_missing_values(tmp_path, raw_tables, table_name):
+    raw = raw_tables[table_name]
+    # a row with NaN in every text column, as pandas reads the empty fields of a csv
+    raw.loc[raw.index[1], raw.columns[raw.dtypes == object]] = np.nan
+    checkpoints = CheckpointStore(str(tmp_path))
+    checkpoints.save(raw, table_name, 'raw')
+    loaded = checkpoints.load(table_name, 'raw')
+    pd.testing.assert_frame_equal(loaded, raw)
+    assert missing_values(loaded) == missing_values(raw)
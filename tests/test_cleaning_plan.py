@@ -0,0 +1,116 @@
+import pandas as pd
+import pytest
+
+from data_cleaning import DataCleaning
+
+
+def expected_table(raw, rows, columns):
+    '''
+    the cleaned table expected from the raw rows: each column is either its raw values (None)
+    or the listed cleaned values, in the given order
+    '''
+    return pd.DataFrame({column: raw.loc[rows, column] if values is None else pd.Series(values, index=rows)
+                         for column, values in columns.items()})
+
+
+def dates(*values):
+    return [pd.Timestamp(value) for value in values]
+
+
+# the output of the per-method cleaners the cleaning plans replaced, on the conftest raw tables
+LEGACY_OUTPUT = {
+    'dim_users': ([0, 1, 7], {
+        'index': None,
+        'first_name': None,
+        'last_name': None,
+        'date_of_birth': dates('1968-10-16', '1940-06-07', '1975-12-01'),
+        'company': None,
+        'email_address': ['sigfried@example.com', 'guy@example.org', 'anna@mail.de'],
+        'address': ['Zimmerstr. 1/0 59015 Gießen', '44 Jones Street London', 'N/A'],
+        'country': None,
+        'country_code': ['DE', 'GB', 'GB'],
+        'phone_number': ['0047905356', '01184960109', '001-4032839012'],
+        'join_date': dates('2018-10-10', '2002-03-01', '2020-01-01'),
+        'user_uuid': None,
+    }),
+    'dim_card_details': ([0, 1, 3, 4], {
+        'card_number': ['30060773296197', '4971858637664481', '349624180933183', '4252720361802860591'],
+        'expiry_date': None,
+        'card_provider': None,
+        'date_payment_confirmed': dates('2015-11-25', '2001-06-18', '2021-12-17', '2022-05-07'),
+    }),
+    'dim_products': ([0, 1, 2, 3, 4, 7], {
+        'product_name': None,
+        'product_price': ['39.99', '9.99', '79.49', '24.00', '2.50', '6.75'],
+        'weight': [1.6, 1.2, 0.1417475, 0.077, 0.4, 2.0],
+        'category': None,
+        'EAN': None,
+        'date_added': dates('2005-12-02', '2006-09-03', '2008-01-11', '2016-04-16', '2000-01-01', '2019-08-14'),
+        'uuid': None,
+        'still_available': [True, False, True, True, False, True],
+        'product_code': None,
+        'weight_class': ['Light', 'Light', 'Light', 'Light', 'Light', 'Mid_Sized'],
+    }),
+    'dim_store_details': ([0, 1, 2, 6, 7], {
+        'index': None,
+        'address': ['N/A', 'Flat 72W Sally isle East Deantown E7B 8EB', 'Heckerstraße 4/5 50491 Säckingen',
+                    '1 Main Street Boston', 'Heckerstraße 4/5 50491 Säckingen'],
+        'longitude': [float('nan'), '-0.74934', '12.16', '-71.05977', float('nan')],
+        'locality': None,
+        'store_code': None,
+        'staff_numbers': ['325', '34', '78', '17', '9'],
+        'opening_date': dates('2010-06-12', '1996-10-25', '2006-05-08', '2012-04-01', '2003-03-03'),
+        'store_type': None,
+        'latitude': [float('nan'), '51.62907', '48.52961', '42.36008', '13.1'],
+        'country_code': None,
+        'continent': ['Europe', 'Europe', 'Europe', 'America', 'Europe'],
+    }),
+    'orders_table': (list(range(8)), {
+        'index': list(range(8)),
+        'date_uuid': None,
+        'user_uuid': None,
+        'card_number': None,
+        'store_code': None,
+        'product_code': None,
+        'product_quantity': None,
+    }),
+    'dim_date_times': (['0', '1', '2', '4'], {
+        'timestamp': ['22:00:06', '22:44:06', '10:05:37', '00:00:00'],
+        'month': None,
+        'year': None,
+        'day': None,
+        'time_period': None,
+        'date_uuid': None,
+    }),
+}
+
+
+@pytest.mark.parametrize('table_name', list(LEGACY_OUTPUT))
+def test_plan_matches_the_per_method_cleaners(raw_tables, table_name):
+    rows, columns = LEGACY_OUTPUT[table_name]
+    expected = expected_table(raw_tables[table_name].copy(), rows, columns)
+    cleaned = DataCleaning().clean_table(raw_tables[table_name], table_name)
+    pd.testing.assert_frame_equal(cleaned, expected)
+
+
+def test_rejected_rows_are_quarantined(raw_tables):
+    data_cleaning = DataCleaning()
+    data_cleaning.clean_table(raw_tables['dim_products'], 'dim_products')
+    data_cleaning.clean_table(raw_tables['dim_store_details'], 'dim_store_details')
+    quarantined = data_cleaning.quarantined_rows()
+    assert {column: list(rejected.index) for column, rejected in quarantined.items()} == {
+        'category': [5], 'locality': [5]}
+
+
+@pytest.mark.parametrize('table_name', list(LEGACY_OUTPUT))
+def test_partitions_cleaned_in_worker_processes_match_the_serial_run(raw_tables, table_name):
+    serial_cleaning = DataCleaning()
+    parallel_cleaning = DataCleaning(workers=3, partition_rows=2)
+    serial = serial_cleaning.clean_table(raw_tables[table_name].copy(), table_name)
+    parallel = parallel_cleaning.clean_table(raw_tables[table_name].copy(), table_name)
+    pd.testing.assert_frame_equal(parallel, serial)
+    serial_quarantine = serial_cleaning.quarantined_rows()
+    parallel_quarantine = parallel_cleaning.quarantined_rows()
+    assert list(parallel_quarantine) == list(serial_quarantine)
+    for column_name, rejected in serial_quarantine.items():
+        pd.testing.assert_frame_equal(parallel_quarantine[column_name], rejected)
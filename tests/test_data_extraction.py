@@ -0,0 +1,111 @@
+import gzip
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from data_extraction import API_SETTINGS_KEYS, DataExtractor
+from settings import Settings
+
+
+class StoreAPI(BaseHTTPRequestHandler):
+    '''
+    Serves /store/<index> as {"index": <index>}. failures maps a store to the statuses answered
+    before it succeeds ('slow' sleeps past the client's timeout), and the later stores answer
+    sooner than the earlier ones so they finish out of order.
+    '''
+    failures = {}
+    requests_seen = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        store = int(self.path.rsplit('/', 1)[1])
+        with self.lock:
+            attempt = self.requests_seen.get(store, 0)
+            self.requests_seen[store] = attempt + 1
+        failures = self.failures.get(store, [])
+        if attempt < len(failures):
+            if failures[attempt] == 'slow':
+                time.sleep(1)
+            else:
+                self.send_response(failures[attempt])
+                self.end_headers()
+                return
+        time.sleep(0.01 * (10 - store % 10))
+        body = json.dumps({'index': store}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def store_api(tmp_path):
+    StoreAPI.failures = {}
+    StoreAPI.requests_seen = {}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StoreAPI)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings_path = tmp_path / 'api_creds.yaml'
+    settings = {key: 'unused' for key in API_SETTINGS_KEYS}
+    settings['retrieve_store_data'] = f"http://127.0.0.1:{server.server_address[1]}/store/"
+    settings_path.write_text(json.dumps(settings))
+    yield DataExtractor(settings=Settings(str(settings_path), API_SETTINGS_KEYS))
+    server.shutdown()
+    server.server_close()
+
+
+def test_stores_are_kept_in_index_order(store_api):
+    df = store_api.retrieve_stores_data(20, max_workers=8, backoff=0)
+    assert df['index'].tolist() == list(range(20))
+
+
+def test_server_errors_and_rate_limits_are_retried(store_api):
+    StoreAPI.failures = {1: [503], 2: [429, 429], 3: [500, 502, 504]}
+    df = store_api.retrieve_stores_data(5, max_workers=5, retries=3, backoff=0)
+    assert df['index'].tolist() == list(range(5))
+    assert [StoreAPI.requests_seen[store] for store in range(5)] == [1, 2, 3, 4, 1]
+
+
+def test_timeouts_are_retried(store_api):
+    StoreAPI.failures = {0: ['slow']}
+    df = store_api.retrieve_stores_data(2, max_workers=2, timeout=0.3, retries=2, backoff=0)
+    assert df['index'].tolist() == [0, 1]
+    assert StoreAPI.requests_seen[0] == 2
+
+
+def test_gives_up_after_the_retries(store_api):
+    StoreAPI.failures = {1: [503] * 5}
+    with pytest.raises(requests.exceptions.RetryError):
+        store_api.retrieve_stores_data(3, max_workers=3, retries=2, backoff=0)
+    assert StoreAPI.requests_seen[1] == 3
+
+
+def test_pdf_without_tables_is_an_error():
+    with pytest.raises(ValueError, match="No tables"):
+        DataExtractor.merge_pdf_pages([])
+
+
+def test_streamed_json_has_the_same_values_as_json_load():
+    data = {'timestamp': {'0': '22:00:06'}, 'month': {'0': 9}, 'year': {'0': 2012.5}, 'day': {'0': None}}
+    columns = list(DataExtractor.iter_json_columns(io.BytesIO(json.dumps(data).encode())))
+    assert columns == [(key, list(values), list(values.values())) for key, values in data.items()]
+    assert [type(value) for _, _, values in columns for value in values] == [str, int, float, type(None)]
+
+
+def test_products_are_read_with_the_column_dtypes():
+    csv = (',product_name,product_price,weight,category,EAN,date_added,uuid,removed,product_code\n'
+           '0,FurReal Dazzlin\' Dimples,£39.99,1.6kg,toys-and-games,0127768471386,2005-12-02,'
+           '83dc0a69-f96f-4c34-bcb7-928acae19a94,Still_avaliable,R7-3126933h\n')
+    df = DataExtractor.read_products(io.BytesIO(gzip.compress(csv.encode())), 'products.csv.gz')
+    assert df['EAN'].tolist() == ['0127768471386']
+    assert df['Unnamed: 0'].dtype == 'int64'
+    assert (df.drop(columns='Unnamed: 0').dtypes == object).all()
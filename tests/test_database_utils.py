@@ -0,0 +1,131 @@
+import contextlib
+
+import pandas as pd
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from database_utils import DatabaseConnector
+from schema_registry import SCHEMAS
+
+DATE_UUIDS = ['9476f17e-5d6a-4117-874d-9cdb38ca1fa6', '0423a395-a04d-4e4a-bd0f-d237cbd5a295']
+
+
+class Cursor:
+    '''
+    Stands in for a psycopg2 cursor: it records the statements and the rows copied into each
+    table, and answers the upsert index lookup and the duplicate key check.
+    '''
+    def __init__(self, has_index, duplicates):
+        self.has_index = has_index
+        self.duplicates = duplicates
+        self.statements = []
+        self.copied = {}
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, statement, parameters=None):
+        self.statements.append(statement)
+        if statement.startswith('SELECT to_regclass'):
+            self.result = [(parameters[0] if self.has_index else None,)]
+        elif 'HAVING COUNT(*) > 1' in statement:
+            self.result = self.duplicates
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+    def copy_expert(self, statement, buffer):
+        table_name = statement.split()[1].strip('"')
+        self.copied[table_name] = self.copied.get(table_name, '') + buffer.read()
+
+
+class Connection:
+    def __init__(self, cursor):
+        self.cursor_ = cursor
+        self.committed = False
+        self.rolled_back = False
+
+    def cursor(self):
+        return self.cursor_
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        pass
+
+
+class Engine:
+    '''
+    Stands in for a postgresql engine whose raw connections use the given cursor.
+    '''
+    dialect = postgresql.dialect()
+
+    def __init__(self, cursor):
+        self.connection = Connection(cursor)
+
+    def begin(self):
+        return contextlib.nullcontext()
+
+    def raw_connection(self):
+        return self.connection
+
+
+def upsert(df, cursor):
+    connector = DatabaseConnector()
+    engine = Engine(cursor)
+    connector.init_local_engine = lambda yaml_file: engine
+    connector.create_table = lambda schema, connection, if_exists='replace': None
+    connector.upsert_to_db(df, 'orders_table', 'db_creds.yaml', schema=SCHEMAS['orders_table'])
+    return engine.connection
+
+
+def orders(date_uuids, quantities):
+    return pd.DataFrame({
+        'index': range(len(date_uuids)),
+        'date_uuid': date_uuids,
+        'user_uuid': '93caf182-e4e9-4c6e-bebb-60a1a9dcf9b8',
+        'card_number': '30060773296197',
+        'store_code': 'BL-8387506C',
+        'product_code': 'R7-3126933h',
+        'product_quantity': quantities,
+    })
+
+
+def test_rows_are_upserted_on_the_unique_key_of_the_schema():
+    cursor = Cursor(has_index=False, duplicates=[])
+    connection = upsert(orders([DATE_UUIDS[0], DATE_UUIDS[1], DATE_UUIDS[0]], [1, 2, 3]), cursor)
+    assert connection.committed
+    assert 'CREATE UNIQUE INDEX orders_table_upsert_key ON orders_table (date_uuid)' in cursor.statements
+    assert 'ON CONFLICT (date_uuid) DO UPDATE SET index = EXCLUDED.index' in cursor.statements[-1]
+    assert 'date_uuid = EXCLUDED' not in cursor.statements[-1]
+    # the rows with the same key are upserted once, keeping the last of them
+    copied_rows = cursor.copied['orders_table_stage'].splitlines()
+    assert [(row.split(',')[1], row.split(',')[-1]) for row in copied_rows] == [
+        (DATE_UUIDS[1], '2.0'), (DATE_UUIDS[0], '3.0')]
+
+
+def test_table_with_rows_of_the_same_key_is_not_upserted_into():
+    cursor = Cursor(has_index=False, duplicates=[(DATE_UUIDS[0],)])
+    with pytest.raises(ValueError, match='orders_table already has rows with the same date_uuid'):
+        upsert(orders(DATE_UUIDS, [1, 2]), cursor)
+    assert not any(statement.startswith('CREATE UNIQUE INDEX') for statement in cursor.statements)
+    assert cursor.copied == {}
+
+
+def test_duplicate_check_is_skipped_once_the_unique_index_exists():
+    cursor = Cursor(has_index=True, duplicates=[(DATE_UUIDS[0],)])
+    connection = upsert(orders(DATE_UUIDS, [1, 2]), cursor)
+    assert connection.committed
+    assert not any('HAVING COUNT(*) > 1' in statement for statement in cursor.statements)
+    assert len(cursor.copied['orders_table_stage'].splitlines()) == 2
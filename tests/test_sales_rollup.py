@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from sales_rollup import SalesRollup
+
+DATE_UUIDS = ['d0', 'd1', 'd2', 'd3']
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    pd.DataFrame({'date_uuid': DATE_UUIDS, 'year': ['2021', '2021', '2022', '2022'],
+                  'month': ['5', '6', '5', '5']}).to_sql('dim_date_times', engine, index=False)
+    pd.DataFrame({'product_code': ['p0', 'p1'], 'product_price': [2.5, 10.0]}).to_sql(
+        'dim_products', engine, index=False)
+    pd.DataFrame({'store_code': ['s0', 's1'], 'store_type': ['Local', 'Web Portal'],
+                  'country_code': ['GB', 'DE']}).to_sql('dim_store_details', engine, index=False)
+    add_orders(engine, [(0, 'd0', 's0', 'p0', 2), (1, 'd1', 's1', 'p1', 1), (2, 'd2', 's0', 'p1', 3)])
+    return engine
+
+
+def add_orders(engine, orders):
+    pd.DataFrame(orders, columns=['index', 'date_uuid', 'store_code', 'product_code', 'product_quantity']).to_sql(
+        'orders_table', engine, index=False, if_exists='append')
+
+
+def rollup(engine):
+    return pd.read_sql_table('sales_rollup', engine).sort_values(
+        ['year', 'month', 'store_type', 'country_code'], ignore_index=True)
+
+
+def test_months_of_the_new_orders_are_looked_up_in_the_dates_table(engine):
+    add_orders(engine, [(3, 'd3', 's1', 'p0', 4), (4, 'd1', 's0', 'p0', 1), (5, 'unknown', 's0', 'p0', 1)])
+    assert sorted(SalesRollup.changed_months(engine, 2, 5)) == [('2021', '6'), ('2022', '5')]
+    assert SalesRollup.changed_months(engine, 5, 5) == []
+
+
+def test_refreshing_the_changed_months_matches_a_rebuild(engine):
+    sales_rollup = SalesRollup()
+    sales_rollup.refresh(engine)
+    add_orders(engine, [(3, 'd3', 's1', 'p0', 4), (4, 'd1', 's0', 'p0', 1)])
+    sales_rollup.refresh(engine, sales_rollup.changed_months(engine, 2, 4))
+    refreshed = rollup(engine)
+    sales_rollup.refresh(engine)
+    pd.testing.assert_frame_equal(refreshed, rollup(engine))
+    assert len(refreshed) == 5
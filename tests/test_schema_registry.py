@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+from sqlalchemy import Boolean, Integer, String, Uuid
+
+from data_cleaning import DataCleaning
+from schema_registry import SCHEMAS, TableSchema
+
+STORES = TableSchema('stores', {
+    'store_uuid': Uuid(as_uuid=False),
+    'store_code': String(5),
+    'staff_numbers': Integer(),
+    'open': Boolean(),
+}, primary_key=['store_uuid'])
+
+
+def stores(**columns):
+    df = pd.DataFrame({
+        'store_uuid': ['5b0a4a2e-7c4f-4a43-9a4c-0e2b3e6a9c11', '0c4d6a1e9b3f4e1a8c2d7f6b5a4e3d2c'],
+        'store_code': ['BA-01', 'LO-02'],
+        'staff_numbers': ['34', 9],
+        'open': [True, None],
+    })
+    for column_name, values in columns.items():
+        df[column_name] = values
+    return df
+
+
+def test_values_are_cast_to_the_column_types():
+    cast_df = STORES.cast(stores()[['open', 'staff_numbers', 'store_code', 'store_uuid']])
+    assert list(cast_df.columns) == ['store_uuid', 'store_code', 'staff_numbers', 'open']
+    assert cast_df['staff_numbers'].tolist() == [34, 9]
+    assert str(cast_df['staff_numbers'].dtype) == 'Int64'
+    assert cast_df['open'].tolist() == [True, pd.NA]
+
+
+@pytest.mark.parametrize('column_name, values, message', [
+    ('store_uuid', ['5b0a4a2e-7c4f-4a43-9a4c-0e2b3e6a9c11', 'not-a-uuid'], "'not-a-uuid'"),
+    ('store_code', ['BA-01', 'LONDON'], "'LONDON'"),
+    ('staff_numbers', ['34', 'J78'], "'J78'"),
+    ('staff_numbers', ['34', '9.5'], "'9.5'"),
+])
+def test_value_that_cannot_be_cast_is_named(column_name, values, message):
+    with pytest.raises(ValueError, match=f"^stores.{column_name}: 1 values can't be cast .*{message}"):
+        STORES.cast(stores(**{column_name: values}))
+
+
+def test_missing_primary_key_value_is_rejected():
+    with pytest.raises(ValueError, match='^stores.store_uuid: the primary key has missing values'):
+        STORES.cast(stores(store_uuid=['5b0a4a2e-7c4f-4a43-9a4c-0e2b3e6a9c11', None]))
+
+
+def test_columns_not_in_the_schema_are_rejected():
+    with pytest.raises(ValueError, match=r"unknown \['address'\], missing \['open'\]"):
+        STORES.cast(stores(address=['1 Main Street', 'N/A']).drop(columns='open'))
+
+
+@pytest.mark.parametrize('table_name', list(SCHEMAS))
+def test_cleaned_tables_match_their_schema(raw_tables, table_name):
+    cleaned = DataCleaning().clean_table(raw_tables[table_name], table_name)
+    assert len(SCHEMAS[table_name].cast(cleaned)) == len(cleaned)
@@ -0,0 +1,95 @@
+import json
+import os
+import threading
+
+
+class WatermarkStore:
+    '''
+    Watermark Store class keeps the high-water mark of each source table in a local json file,
+    so the next run only extracts the rows added since the last successful load.
+
+    Attributes:
+    ----------
+    path: str
+        location of the json file holding the watermarks
+
+    Methods:
+    -------
+    get(table_name)
+        returns the watermark of the table or None if it was never loaded
+
+    set(table_name, watermark)
+        stores the watermark of the table
+
+    reset(table_name)
+        removes the watermark so the next run does a full refresh
+    '''
+    def __init__(self, path='state/watermarks.json'):
+        self.path = path
+        self.__lock = threading.Lock()
+
+    def read_watermarks(self):
+        '''
+        reads every watermark from the json file
+
+        Returns:
+        --------
+        watermarks: dict
+            the watermarks keyed by table name (empty if the file doesn't exist yet)
+        '''
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r') as file:
+            return json.load(file)
+
+    def get(self, table_name):
+        '''
+        returns the watermark of the table
+
+        Parameters:
+        -----------
+        table_name: str
+            the name of the source table
+
+        Returns:
+        --------
+        watermark: int, str or None
+            the highest value of the watermark column already loaded
+        '''
+        with self.__lock:
+            return self.read_watermarks().get(table_name)
+
+    def set(self, table_name, watermark):
+        '''
+        stores the watermark of the table. The file is replaced atomically so a crash never
+        leaves it half written.
+
+        Parameters:
+        -----------
+        table_name: str
+            the name of the source table
+
+        watermark: int, str or None
+            the highest value of the watermark column loaded
+        '''
+        if hasattr(watermark, 'item'):
+            watermark = watermark.item()
+        with self.__lock:
+            watermarks = self.read_watermarks()
+            watermarks[table_name] = watermark
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as file:
+                json.dump(watermarks, file, indent=4, default=str)
+            os.replace(temp_path, self.path)
+
+    def reset(self, table_name):
+        '''
+        removes the watermark of the table
+
+        Parameters:
+        -----------
+        table_name: str
+            the name of the source table
+        '''
+        self.set(table_name, None)